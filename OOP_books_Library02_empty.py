@@ -1,34 +1,93 @@
 # -*- coding: utf-8 -*-
 # Příliš žluťoučký kůň úpěl ďábelské ódy - testovací pangram
 
+import asyncio
+import bisect
+import collections
+import concurrent.futures
+import contextlib
 import datetime
+import functools
+import gc
+import itertools
 import json
+import mmap
 import os
+import random
+import re
+import secrets
+import struct
+import stat
+import sys
+import threading
+import time
+import unicodedata
 
 
 
 class Book:
+    # Fixed attribute slots instead of a per-instance __dict__ keep large catalogs small
+    __slots__ = ("_library", "_title", "_author", "_year", "_available")
+    # Tag of the class in serialized records, see BOOK_TYPES
+    type_tag = "book"
+
     def __init__(self, title: str, author: str, year: int, available: bool = True):
-        self.title = title
-        self.author = author
-        self.year = year
-        self.available = available
+        # Library that indexes this book (set by Library.add_book)
+        self._library = None
+        self._title = title
+        self._author = author
+        self._year = year
+        self._available = available
+
+    # Title, author and year are read-only: the library indexes and sorted
+    # views are keyed by them. To change them, replace the book.
+    @property
+    def title(self):
+        return self._title
+
+    @property
+    def author(self):
+        return self._author
+
+    @property
+    def year(self):
+        return self._year
+
+    @property
+    def available(self):
+        return self._available
+
+    @available.setter
+    def available(self, value: bool):
+        previous_value = self._available
+        self._available = value
+        # Keep the availability index of the owning library in sync
+        if self._library is not None and previous_value != value:
+            self._library._availability_changed(self)
+
+    def _lock(self):
+        # Lock guarding the check-and-set in borrow()/return_book()
+        if self._library is None:
+            return _NO_LOCK
+        return self._library._lock_for(self)
 
     def borrow(self):
-        # Check if the book is already borrowed
-        if self.available == False:
-            error_message = f"Kniha '{self.title}' je již vypůjčená."
-            raise ValueError(error_message)
-        # Change the state to indicate the book is now borrowed
-        self.available = False
+        with self._lock():
+            # Check if the book is already borrowed
+            if self.available == False:
+                error_message = f"Kniha '{self.title}' je již vypůjčená."
+                raise ValueError(error_message)
+            # Change the state to indicate the book is now borrowed
+            self.available = False
 
     def return_book(self):
-        # Check if the book is already available
-        if self.available == True:
-            error_message = f"Kniha '{self.title}' již byla dostupná."
-            raise ValueError(error_message)
-        # Change the state to indicate the book has been returned
-        self.available = True
+        with self._lock():
+            # Check if the book is already available
+            if self.available == True:
+                error_message = f"Kniha '{self.title}' již byla dostupná."
+                raise ValueError(error_message)
+            # Change the state to indicate the book has been returned
+            self.available = True
 
     def __str__(self):
         # Determine the availability status as a string
@@ -41,19 +100,38 @@ class Book:
         return book_str
 
     def to_dict(self):
-        # Convert the book object to a dictionary representation
+        # Convert the book object to a type-tagged dictionary representation;
+        # subclasses add their own fields
         book_dictionary = {
+            "type": self.type_tag,
             "title": self.title,
             "author": self.author,
             "year": self.year,
-            "available": self.available,
+            "available": self._available,
         }
         return book_dictionary
 
     @staticmethod
-    def is_valid_year(year):
-        # Get the current year from the system clock
-        current_year = datetime.datetime.now().year
+    def from_dict(book_dictionary: dict):
+        # Create a book of the tagged class from its dictionary (inverse of
+        # to_dict). Only checks that the required fields are present, values
+        # are not validated, see Book.from_record and Library.books_from_records
+        registered = BOOK_TYPES.get(book_dictionary.get("type", "book"))
+        if registered is None:
+            raise ValueError(f"Neznámý typ knihy: {book_dictionary.get('type')}")
+        book_class, schema = registered
+        missing_fields = [field for field, (_, default) in schema.items()
+                          if default is _REQUIRED and field not in book_dictionary]
+        if missing_fields:
+            raise ValueError(f"Chybí povinné položky knihy: {', '.join(missing_fields)}.")
+        return book_class(**{field: book_dictionary[field] for field in schema if field in book_dictionary})
+
+    @staticmethod
+    def is_valid_year(year, current_year: int = None):
+        # Get the current year from the system clock, unless the caller
+        # validating many books at once already did
+        if current_year is None:
+            current_year = datetime.datetime.now().year
         # Check if the year is within the valid range
         if year >= 1440 and year <= current_year:
             return True
@@ -61,7 +139,23 @@ class Book:
             return False
 
     @staticmethod
-    def parse_from_string(str_book: str):
+    def from_record(book_record: dict, current_year: int = None):
+        # Create a book of the tagged class from a record validated and
+        # normalized against its schema, the same way a loaded library is.
+        # Raises ValueError naming every invalid field.
+        registered = BOOK_TYPES.get(book_record.get("type", "book"))
+        if registered is None:
+            raise ValueError(f"Neznámý typ knihy: {book_record.get('type')}")
+        book_class, schema = registered
+        if current_year is None:
+            current_year = datetime.datetime.now().year
+        values, errors = _coerce_fields(tuple(schema.items()), book_record, current_year)
+        if errors:
+            raise ValueError(" ".join(f"{field}: {message}" for field, message in errors))
+        return book_class(**values)
+
+    @staticmethod
+    def parse_from_string(str_book: str, current_year: int = None):
         # Split the string by the semicolon character
         parts = str_book.split(";")
         if len(parts) != 3:
@@ -74,15 +168,18 @@ class Book:
             year_part = int(year_part_str)
         except Exception as e:
             raise ValueError("Rok knihy musí být číslo.") from e
-        # Create and return a new Book instance
-        new_book = Book(title=title_part, author=author_part, year=year_part)
+        # Create and return a new Book instance, validated like a loaded one
+        new_book = Book.from_record({"title": title_part, "author": author_part, "year": year_part}, current_year)
         return new_book
 
 
 class Ebook(Book):
-    def __init__(self, title: str, author: str, year: int, file_format: str):
+    __slots__ = ("file_format",)
+    type_tag = "ebook"
+
+    def __init__(self, title: str, author: str, year: int, file_format: str, available: bool = True):
         # Initialize the parent Book class
-        super().__init__(title, author, year)
+        super().__init__(title, author, year, available)
         self.file_format = file_format
 
     def __str__(self):
@@ -92,11 +189,20 @@ class Ebook(Book):
         extended_description = base_description + f" | Formát: {self.file_format}"
         return extended_description
 
+    def to_dict(self):
+        # Add the Ebook-specific field to the Book dictionary
+        book_dictionary = super().to_dict()
+        book_dictionary["file_format"] = self.file_format
+        return book_dictionary
+
 
 class AudioBook(Book):
-    def __init__(self, title: str, author: str, year: int, duration: float):
+    __slots__ = ("duration",)
+    type_tag = "audiobook"
+
+    def __init__(self, title: str, author: str, year: int, duration: float, available: bool = True):
         # Initialize the parent Book class
-        super().__init__(title, author, year)
+        super().__init__(title, author, year, available)
         self.duration = duration
 
     def __str__(self):
@@ -106,76 +212,1700 @@ class AudioBook(Book):
         extended_description = base_description + f" | Délka: {self.duration}"
         return extended_description
 
+    def to_dict(self):
+        # Add the AudioBook-specific field to the Book dictionary
+        book_dictionary = super().to_dict()
+        book_dictionary["duration"] = self.duration
+        return book_dictionary
+
+
+def _fsync_directory(file_path: str):
+    # Make a rename in the directory of file_path durable (POSIX only)
+    if os.name != "posix":
+        return
+    directory = os.open(os.path.dirname(os.path.abspath(file_path)), os.O_RDONLY)
+    try:
+        os.fsync(directory)
+    finally:
+        os.close(directory)
+
+
+def _create_temporary_file(file_path: str):
+    # Create a new file with a unique name next to file_path and return its
+    # descriptor and path. Unlike tempfile.mkstemp (owner-only permissions) it
+    # is created with 0o666, so the kernel applies the umask as for any file.
+    flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0)
+    while True:
+        temporary_path = f"{file_path}.{secrets.token_hex(4)}.tmp"
+        try:
+            return os.open(temporary_path, flags, 0o666), temporary_path
+        except FileExistsError:
+            continue
+
+
+@contextlib.contextmanager
+def _atomic_open(file_path: str, mode: str = "w"):
+    # Write through a temporary file next to file_path, which replaces it only
+    # once it is completely written and synced to disk. A crash, Ctrl-C or an
+    # error mid-write leaves the previous file untouched. The temporary file
+    # has a unique name, so concurrent writers never share it.
+    file_descriptor, temporary_path = _create_temporary_file(file_path)
+    try:
+        with open(file_descriptor, mode, encoding=None if "b" in mode else "utf-8") as temporary_file:
+            # Keep the permissions of the replaced file, new files keep the usual ones
+            with contextlib.suppress(FileNotFoundError):
+                os.chmod(temporary_path, stat.S_IMODE(os.stat(file_path).st_mode))
+            yield temporary_file
+            temporary_file.flush()
+            os.fsync(temporary_file.fileno())
+        os.replace(temporary_path, file_path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(temporary_path)
+        raise
+    _fsync_directory(file_path)
+
+
+def _write_json_file(file_path: str, books_dictionaries: list):
+    # Atomically write the list of books to a JSON file with formatting options
+    with _atomic_open(file_path) as json_file:
+        json.dump(books_dictionaries, json_file, ensure_ascii=False, indent=4)
+
+
+class LibraryLoadError(ValueError):
+    # Raised instead of returning a partially loaded library. errors lists
+    # every invalid field as (record number from 1, field or None, message).
+
+    def __init__(self, errors: list):
+        self.errors = errors
+        invalid_records = len({record_number for record_number, _, _ in errors})
+        super().__init__(f"Knihovnu nelze načíst, neplatných záznamů: {invalid_records}.")
+
+    def report(self):
+        # One line per error, for printing
+        return "\n".join(f"Záznam {record_number}" + (f", {field}" if field else "") + f": {message}"
+                         for record_number, field, message in self.errors)
+
+
+def _coerce_text(value, current_year: int):
+    if not isinstance(value, str) or not value.strip():
+        raise ValueError("Musí být neprázdný text.")
+    return value
+
+
+def _coerce_year(value, current_year: int):
+    # Years are stored as int; older files also contain them as strings
+    if isinstance(value, str):
+        try:
+            value = int(value)
+        except ValueError:
+            raise ValueError("Rok knihy musí být číslo.") from None
+    elif not isinstance(value, int) or isinstance(value, bool):
+        raise ValueError("Rok knihy musí být číslo.")
+    if not Book.is_valid_year(value, current_year):
+        raise ValueError(f"Rok {value} není mezi 1440 a {current_year}.")
+    return value
+
+
+def _coerce_flag(value, current_year: int):
+    if not isinstance(value, bool):
+        raise ValueError("Musí být true nebo false.")
+    return value
+
+
+def _coerce_duration(value, current_year: int):
+    if not isinstance(value, (int, float)) or isinstance(value, bool) or value < 0:
+        raise ValueError("Délka musí být nezáporné číslo.")
+    return value
+
+
+_REQUIRED = object()
+
+
+def _coerce_fields(fields: tuple, record: dict, current_year: int):
+    # Coerce the fields of one record, fields are the items of its schema.
+    # Returns (values, [(field, message)]), values are complete only when
+    # there are no errors.
+    values = {}
+    errors = []
+    for field, (coerce, default) in fields:
+        value = record.get(field, default)
+        if value is _REQUIRED:
+            errors.append((field, "Chybí povinná položka."))
+            continue
+        try:
+            values[field] = coerce(value, current_year)
+        except ValueError as error:
+            errors.append((field, str(error)))
+    return values, errors
+
+# Schema of a book record, {field: (coerce function, default value)}. The
+# fields are constructor arguments and attributes of the book class. A coerce
+# function returns the normalized value or raises ValueError; fields with the
+# _REQUIRED default must be present.
+BOOK_SCHEMA = {
+    "title": (_coerce_text, _REQUIRED),
+    "author": (_coerce_text, _REQUIRED),
+    "year": (_coerce_year, _REQUIRED),
+    "available": (_coerce_flag, True),
+}
+EBOOK_SCHEMA = {**BOOK_SCHEMA, "file_format": (_coerce_text, _REQUIRED)}
+AUDIOBOOK_SCHEMA = {**BOOK_SCHEMA, "duration": (_coerce_duration, _REQUIRED)}
+
+# Serializable book classes, {type tag: (class, schema)}. Records carry the
+# tag in their "type" field, records without it are plain books.
+BOOK_TYPES = {}
+
+
+def register_book_type(book_class: type, schema: dict):
+    # Make a Book subclass with its own type_tag and to_dict serializable
+    BOOK_TYPES[book_class.type_tag] = (book_class, schema)
+
+
+register_book_type(Book, BOOK_SCHEMA)
+register_book_type(Ebook, EBOOK_SCHEMA)
+register_book_type(AudioBook, AUDIOBOOK_SCHEMA)
+
+
+def _encode_books(books):
+    # Encode books to type-tagged dictionaries. Consecutive books of the same
+    # class form a run, encoded with one lookup of the class's to_dict.
+    books_dictionaries = []
+    for book_class, run in itertools.groupby(books, type):
+        if BOOK_TYPES.get(book_class.type_tag, (None,))[0] is not book_class:
+            raise ValueError(f"Typ knihy {book_class.__name__} není registrovaný.")
+        encode = book_class.to_dict
+        books_dictionaries.extend([encode(book) for book in run])
+    return books_dictionaries
+
+
+# Binary snapshot layout (Library.save_binary, MappedCatalog), little-endian:
+#   header:  magic, format version, record size, number of records
+#   records: fixed-size records, one per book, in catalog order
+#   heap:    UTF-8 strings referenced from the records by (offset, length),
+#            each distinct string stored once
+# A record is: type id, flags, year, (offset, length) of title, author and
+# file format, duration. Offsets are relative to the start of the heap.
+BINARY_MAGIC = b"LIBSNAP\0"
+BINARY_VERSION = 1
+_BINARY_HEADER = struct.Struct("<8sIIQ")
+_BINARY_RECORD = struct.Struct("<BBxxiIIIIIId")
+# Type ids of the binary format, {type tag: id}
+_BINARY_TYPE_IDS = {"book": 0, "ebook": 1, "audiobook": 2}
+# Record flags
+_BINARY_AVAILABLE = 1
+_BINARY_INTEGER_DURATION = 2
+
+
+def _encode_binary(books: list):
+    # Build the binary snapshot of the books, returns (record table, heap)
+    records = bytearray(_BINARY_RECORD.size * len(books))
+    heap = bytearray()
+    string_refs = {"": (0, 0)}
+    pack_record = _BINARY_RECORD.pack_into
+
+    def string_ref(text):
+        ref = string_refs.get(text)
+        if ref is None:
+            data = text.encode("utf-8")
+            ref = string_refs[text] = (len(heap), len(data))
+            heap.extend(data)
+        return ref
+
+    position = 0
+    for book_class, run in itertools.groupby(books, type):
+        type_id = _BINARY_TYPE_IDS.get(book_class.type_tag)
+        if type_id is None or BOOK_TYPES[book_class.type_tag][0] is not book_class:
+            raise ValueError(f"Typ knihy {book_class.__name__} nelze uložit binárně.")
+        for book in run:
+            year = _year_key(book.year)
+            if year is None:
+                raise ValueError(f"Kniha '{book.title}' nemá platný rok.")
+            flags = _BINARY_AVAILABLE if book._available else 0
+            file_format = ""
+            duration = 0.0
+            if type_id == 1:
+                file_format = book.file_format
+            elif type_id == 2:
+                duration = book.duration
+                if isinstance(duration, int):
+                    flags |= _BINARY_INTEGER_DURATION
+            pack_record(records, position, type_id, flags, year,
+                        *string_ref(book.title), *string_ref(book.author), *string_ref(file_format), duration)
+            position += _BINARY_RECORD.size
+    if len(heap) > 0xFFFFFFFF:
+        raise ValueError("Knihovna je pro binární snapshot příliš velká.")
+    return records, heap
+
+
+def _record_type(numbered_record):
+    # Type tag of a (record number, record) pair, None for malformed records
+    record = numbered_record[1]
+    if not isinstance(record, dict):
+        return None
+    type_tag = record.get("type", "book")
+    return type_tag if isinstance(type_tag, str) else None
+
+
+@contextlib.contextmanager
+def _gc_paused():
+    # Bulk loads create millions of objects, each batch of them would trigger
+    # a garbage collection pass over the growing catalog although none of
+    # them is garbage yet
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+
+# Shared no-op lock for books outside of a ConcurrentLibrary
+_NO_LOCK = contextlib.nullcontext()
+
+
+def _year_key(year):
+    # Normalize the year for the year index ("1936" and 1936 are the same year)
+    try:
+        return int(year)
+    except (TypeError, ValueError):
+        return None
+
+
+def _index_add(index: dict, key, book):
+    # Each index bucket is a dict used as an insertion-ordered set
+    bucket = index.get(key)
+    if bucket is None:
+        bucket = index[key] = {}
+    bucket[book] = None
+    return bucket
+
+
+def _index_discard(index: dict, key, book):
+    # Remove the book from its bucket and drop the bucket once it is empty
+    bucket = index.get(key)
+    if bucket is None:
+        return False
+    bucket.pop(book, None)
+    if bucket:
+        return False
+    del index[key]
+    return True
+
+
+def _iter_text_chunks(file_path: str, chunk_size: int):
+    # Read a text file in large chunks cut at line boundaries,
+    # yielding (number of the first line, chunk)
+    with open(file_path, "r", encoding="utf-8") as text_file:
+        line_number = 1
+        remainder = ""
+        while True:
+            chunk = text_file.read(chunk_size)
+            if not chunk:
+                break
+            cut = chunk.rfind("\n") + 1
+            if cut == 0:
+                remainder += chunk
+                continue
+            text = remainder + chunk[:cut]
+            remainder = chunk[cut:]
+            yield line_number, text
+            line_number += text.count("\n")
+        if remainder:
+            yield line_number, remainder + "\n"
+
+
+def _parse_book_lines(first_line_number: int, text: str, current_year: int):
+    # Parse "title;author;year" lines like Book.parse_from_string, but a whole
+    # chunk at once and without raising; rows are validated against
+    # BOOK_SCHEMA like a loaded library.
+    # Returns ([(title, author, year)], [(line number, line, message)]);
+    # blank lines are skipped.
+    rows = []
+    rejected = []
+    append_row = rows.append
+    fields = tuple(BOOK_SCHEMA.items())
+    # The coerce functions are called directly for valid rows, only a
+    # rejected row goes through _coerce_fields to collect every error
+    coerce_title, coerce_author, coerce_year = (BOOK_SCHEMA[field][0] for field in ("title", "author", "year"))
+    lines = text.split("\n")
+    lines.pop()
+    for line_number, line in enumerate(lines, first_line_number):
+        parts = line.split(";")
+        if len(parts) != 3:
+            if line.strip():
+                rejected.append((line_number, line, "Neplatný řetězec pro inicializaci knihy."))
+            continue
+        title = parts[0].strip()
+        author = parts[1].strip()
+        try:
+            append_row((coerce_title(title, current_year), coerce_author(author, current_year),
+                        coerce_year(parts[2].strip(), current_year)))
+        except ValueError:
+            _, errors = _coerce_fields(fields, {"title": title, "author": author, "year": parts[2].strip()},
+                                       current_year)
+            rejected.append((line_number, line, " ".join(f"{field}: {message}" for field, message in errors)))
+    return rows, rejected
+
+
+def _iter_parsed_chunks(file_path: str, chunk_size: int, workers: int):
+    # Parse the chunks in order, in this process or in a process pool. At most
+    # two chunks per worker are in flight, so memory stays bounded.
+    chunks = _iter_text_chunks(file_path, chunk_size)
+    current_year = datetime.datetime.now().year
+    if not workers:
+        for first_line_number, text in chunks:
+            yield _parse_book_lines(first_line_number, text, current_year)
+        return
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        in_flight = collections.deque()
+        for first_line_number, text in chunks:
+            in_flight.append(executor.submit(_parse_book_lines, first_line_number, text, current_year))
+            if len(in_flight) >= 2 * workers:
+                yield in_flight.popleft().result()
+        while in_flight:
+            yield in_flight.popleft().result()
+
+
+# Size of the chunks read by Library.import_books
+IMPORT_CHUNK_SIZE = 4 * 1024 * 1024
+
+
+# Sort keys available for listing, see Library.iter_rendered
+SORT_KEYS = {
+    "title": lambda book: book.title.casefold(),
+    "author": lambda book: (book.author.casefold(), book.title.casefold()),
+    "year": lambda book: (_year_key(book.year) is None, _year_key(book.year) or 0),
+}
+
 
 class Library:
     def __init__(self):
-        # Initialize the internal list to store books
-        self.books = []
+        # Catalog of all books in insertion order, mapped to their insertion number
+        self._catalog = {}
+        self._next_sequence = 0
+        # Sorted views for listing, {sort_key: [(key, sequence, book), ...]},
+        # built on first use and then kept sorted by add_book/remove_book
+        self._sorted_views = {}
+        # Secondary indexes, kept in sync by add_book/remove_book.
+        # Title, author and year are read-only properties of Book.
+        self._by_title = {}
+        self._by_author = {}
+        self._by_year = {}
+        # Sorted distinct years for range queries
+        self._years = []
+        # Availability index, updated whenever Book.available changes
+        self._available_books = {}
+        self._borrowed_books = {}
+        # Callbacks notified about every change: listener(event, book)
+        self._listeners = []
+        # Number of changes so far, and (file path, number of changes) of the
+        # last save_in_json, so saving an unchanged library can be skipped
+        self._change_count = 0
+        self._saved_state = None
+
+    @property
+    def books(self):
+        # Snapshot of the catalog as a list, in insertion order
+        return list(self._catalog)
+
+    def __len__(self):
+        return len(self._catalog)
+
+    def __contains__(self, book):
+        return book in self._catalog
+
+    def __iter__(self):
+        return iter(self._catalog)
+
+    def _lock_for(self, book: Book):
+        # A plain Library is not thread-safe, see ConcurrentLibrary
+        return _NO_LOCK
+
+    def add_listener(self, listener):
+        # Register a callback called as listener(event, book) for
+        # the "add", "remove", "borrow" and "return" events
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        self._listeners.remove(listener)
+
+    def _notify(self, event: str, book: Book):
+        self._change_count += 1
+        for listener in self._listeners:
+            listener(event, book)
 
     def add_book(self, book: Book):
-        # Add a new book to the library
-        self.books.append(book)
+        # Add a new book to the library and all of its indexes
+        if book in self._catalog:
+            print("Kniha už v knihovně je.")
+            return
+        if book._library is not None:
+            raise ValueError(f"Kniha '{book.title}' už patří do jiné knihovny.")
+        self._catalog[book] = self._next_sequence
+        self._next_sequence += 1
+        book._library = self
+        for sort_key, sorted_view in self._sorted_views.items():
+            bisect.insort(sorted_view, (SORT_KEYS[sort_key](book), self._catalog[book], book))
+        _index_add(self._by_title, book.title, book)
+        _index_add(self._by_author, book.author, book)
+        year = _year_key(book.year)
+        if year not in self._by_year and year is not None:
+            bisect.insort(self._years, year)
+        _index_add(self._by_year, year, book)
+        if book.available:
+            self._available_books[book] = None
+        else:
+            self._borrowed_books[book] = None
+        self._notify("add", book)
+
+    def add_books(self, books):
+        # Add many books at once, same as calling add_book for each of them
+        # but with the index updates inlined. The sorted views are dropped
+        # and rebuilt on first use instead of being kept sorted per insertion.
+        self._sorted_views.clear()
+        catalog = self._catalog
+        by_title, by_author, by_year = self._by_title, self._by_author, self._by_year
+        available_books, borrowed_books = self._available_books, self._borrowed_books
+        listeners = self._listeners
+        sequence = self._next_sequence
+        try:
+            for book in books:
+                if book in catalog:
+                    print("Kniha už v knihovně je.")
+                    continue
+                if book._library is not None:
+                    raise ValueError(f"Kniha '{book.title}' už patří do jiné knihovny.")
+                catalog[book] = sequence
+                sequence += 1
+                book._library = self
+                bucket = by_title.get(book.title)
+                if bucket is None:
+                    bucket = by_title[book.title] = {}
+                bucket[book] = None
+                bucket = by_author.get(book.author)
+                if bucket is None:
+                    bucket = by_author[book.author] = {}
+                bucket[book] = None
+                year = _year_key(book.year)
+                bucket = by_year.get(year)
+                if bucket is None:
+                    bucket = by_year[year] = {}
+                    if year is not None:
+                        bisect.insort(self._years, year)
+                bucket[book] = None
+                if book._available:
+                    available_books[book] = None
+                else:
+                    borrowed_books[book] = None
+                for listener in listeners:
+                    listener("add", book)
+        finally:
+            if sequence != self._next_sequence:
+                self._change_count += 1
+            self._next_sequence = sequence
 
     def remove_book(self, book: Book):
         # Remove a book from the library if it exists
-        if book in self.books:
-            self.books.remove(book)
-        else:
+        if book not in self._catalog:
             print("Kniha se nenašla v knihovně.")
+            return
+        sequence = self._catalog.pop(book)
+        book._library = None
+        for sort_key, sorted_view in self._sorted_views.items():
+            del sorted_view[bisect.bisect_left(sorted_view, (SORT_KEYS[sort_key](book), sequence))]
+        _index_discard(self._by_title, book.title, book)
+        _index_discard(self._by_author, book.author, book)
+        year = _year_key(book.year)
+        if _index_discard(self._by_year, year, book) and year is not None:
+            del self._years[bisect.bisect_left(self._years, year)]
+        self._available_books.pop(book, None)
+        self._borrowed_books.pop(book, None)
+        self._notify("remove", book)
+
+    def _availability_changed(self, book: Book):
+        # Move the book between the available and borrowed index
+        if book.available:
+            self._borrowed_books.pop(book, None)
+            self._available_books[book] = None
+        else:
+            self._available_books.pop(book, None)
+            self._borrowed_books[book] = None
+        self._notify("borrow" if not book.available else "return", book)
+
+    def borrow_many(self, books):
+        # Borrow a whole basket of books, either all of them or none
+        return self._change_many(books, self._available_books, False,
+                                 "Kniha '{}' je již vypůjčená.", "Kniha '{}' byla vypůjčena.")
+
+    def return_many(self, books):
+        # Return a whole basket of books, either all of them or none
+        return self._change_many(books, self._borrowed_books, True,
+                                 "Kniha '{}' již byla dostupná.", "Kniha '{}' byla vrácena.")
+
+    def _change_many(self, books, allowed_books: dict, available: bool, conflict_message: str, done_message: str):
+        # Validate the whole basket against the availability index first,
+        # then apply it. Returns a list of (book, success, message) tuples.
+        books = list(books)
+        errors = {}
+        seen_books = set()
+        for book in books:
+            if book in seen_books:
+                errors[book] = f"Kniha '{book.title}' je v košíku vícekrát."
+            elif book not in self._catalog:
+                errors[book] = "Kniha se nenašla v knihovně."
+            elif book not in allowed_books:
+                errors[book] = conflict_message.format(book.title)
+            seen_books.add(book)
+        if errors:
+            skipped_message = "Neprovedeno, košík obsahuje chyby."
+            return [(book, False, errors.get(book, skipped_message)) for book in books]
+        results = []
+        for book in books:
+            book.available = available
+            results.append((book, True, done_message.format(book.title)))
+        return results
+
+    def find_by_title(self, title: str):
+        # Return all books with exactly this title
+        return list(self._by_title.get(title, ()))
 
-    def list_books(self):
-        # Enumerate and print all books in the library
-        index = 1
-        for i in self.books:
-            # Convert each book to its string representation
-            book_info = str(i)
-            print(f"{index}. {book_info}")
-            index += 1
+    def find_by_author(self, author: str):
+        # Return all books written by this author
+        return list(self._by_author.get(author, ()))
+
+    def find_by_year(self, year: int):
+        # Return all books published in this year
+        return list(self._by_year.get(_year_key(year), ()))
+
+    def books_between_years(self, start_year: int, end_year: int):
+        # Return books published between start_year and end_year (inclusive), oldest first
+        first = bisect.bisect_left(self._years, start_year)
+        last = bisect.bisect_right(self._years, end_year)
+        found_books = []
+        for year in self._years[first:last]:
+            found_books.extend(self._by_year[year])
+        return found_books
+
+    def available_books(self):
+        # Return all books that can be borrowed right now
+        return list(self._available_books)
+
+    def borrowed_books(self):
+        # Return all books that are currently borrowed
+        return list(self._borrowed_books)
+
+    def _ordered_slice(self, offset: int, limit, sort_key):
+        # Return one page of books in insertion order or in a sorted view
+        stop = None if limit is None else offset + limit
+        if sort_key is None:
+            return list(itertools.islice(self._catalog, offset, stop))
+        sorted_view = self._sorted_views.get(sort_key)
+        if sorted_view is None:
+            key_function = SORT_KEYS[sort_key]
+            sorted_view = sorted((key_function(book), sequence, book) for book, sequence in self._catalog.items())
+            self._sorted_views[sort_key] = sorted_view
+        return [entry[2] for entry in sorted_view[offset:stop]]
+
+    def iter_rendered(self, offset: int = 0, limit: int = None, sort_key: str = None):
+        # Lazily yield numbered lines for one page of books, optionally sorted
+        # by "title", "author" or "year"
+        if sort_key is not None and sort_key not in SORT_KEYS:
+            raise ValueError(f"Neznámé řazení: {sort_key}")
+        page_books = self._ordered_slice(offset, limit, sort_key)
+        for index, book in enumerate(page_books, start=offset + 1):
+            yield f"{index}. {book}\n"
+
+    def list_books(self, offset: int = 0, limit: int = None, sort_key: str = None, output=None, batch_size: int = 1000):
+        # Print the books, writing the rendered lines in batches instead of line by line
+        if output is None:
+            output = sys.stdout
+        rendered_lines = self.iter_rendered(offset, limit, sort_key)
+        while True:
+            batch = list(itertools.islice(rendered_lines, batch_size))
+            if not batch:
+                break
+            output.write("".join(batch))
 
     def save_in_json(self, file_path: str):
-        # Prepare a list to hold all book dictionaries
-        books_dictionaries = []
-        for book in self.books:
-            book_dict = book.to_dict()
-            books_dictionaries.append(book_dict)
-        # Write the list of books to a JSON file with formatting options
-        with open(file_path, "w", encoding="utf-8") as json_file:
-            json.dump(books_dictionaries, json_file, ensure_ascii=False, indent=4)
+        # Atomically write all books as type-tagged dictionaries. Returns False
+        # without writing if nothing changed since the last save to this file.
+        # The change count is read before the snapshot, so a change made
+        # during the save makes the next save write again.
+        change_count = self._change_count
+        if self._saved_state == (file_path, change_count) and os.path.exists(file_path):
+            return False
+        _write_json_file(file_path, _encode_books(self.books))
+        self._saved_state = (file_path, change_count)
+        return True
+
+    def import_books(self, file_path: str, reject_path: str = None, workers: int = 0,
+                     chunk_size: int = IMPORT_CHUNK_SIZE):
+        # Bulk import of a "title;author;year" file, one book per line. Bad
+        # lines do not stop the import, they are written to reject_path as
+        # "line number<TAB>message<TAB>line". With workers > 0 the chunks
+        # are parsed in a process pool. Returns a report dictionary.
+        with _gc_paused():
+            return self._import_books(file_path, reject_path, workers, chunk_size)
+
+    def _import_books(self, file_path: str, reject_path: str, workers: int, chunk_size: int):
+        started = time.perf_counter()
+        imported = 0
+        rejected = 0
+        reject_file = None
+        try:
+            for rows, rejected_lines in _iter_parsed_chunks(file_path, chunk_size, workers):
+                self.add_books([Book(title, author, year) for title, author, year in rows])
+                imported += len(rows)
+                rejected += len(rejected_lines)
+                if rejected_lines and reject_path is not None:
+                    if reject_file is None:
+                        reject_file = open(reject_path, "w", encoding="utf-8")
+                    reject_file.writelines(f"{line_number}\t{message}\t{line}\n"
+                                           for line_number, line, message in rejected_lines)
+        finally:
+            if reject_file is not None:
+                reject_file.close()
+        seconds = time.perf_counter() - started
+        return {
+            "imported": imported,
+            "rejected": rejected,
+            "seconds": seconds,
+            "rows_per_second": (imported + rejected) / seconds if seconds else 0.0,
+        }
 
     @staticmethod
-    def parse_from_json(file_path: str):
-        # Create an empty library instance
-        new_library = Library()
-        # Open and read the JSON file content
+    def iter_books_from_json(file_path: str, chunk_size: int = 65536):
+        # Stream books from a JSON file without validating them
+        for book_entry in Library.iter_records_from_json(file_path, chunk_size):
+            if not isinstance(book_entry, dict):
+                raise ValueError("Chyba při načítání JSON dat.")
+            yield Book.from_dict(book_entry)
+
+    @staticmethod
+    def iter_records_from_json(file_path: str, chunk_size: int = 65536):
+        # Stream the elements of a JSON array one at a time, so the whole
+        # file is never held in memory (only the current chunk and record)
+        decoder = json.JSONDecoder()
         with open(file_path, "r", encoding="utf-8") as json_file:
-            try:
-                loaded_books = json.load(json_file)
-            except json.JSONDecodeError as err:
-                raise ValueError("Chyba při načítání JSON dat.") from err
-            # Process each book dictionary and add it to the library
-            for book_entry in loaded_books:
-                title_value = book_entry.get("title", "")
-                author_value = book_entry.get("author", "")
-                year_value = book_entry.get("year", 0)
-                available_value = book_entry.get("available", True)
-                created_book = Book(title_value, author_value, year_value, available_value)
-                new_library.add_book(created_book)
-        # Return the populated library instance
+            buffer = ""
+            position = 0
+            expected = "["
+            while True:
+                # Skip whitespace between the array tokens
+                while position < len(buffer) and buffer[position].isspace():
+                    position += 1
+                if position == len(buffer):
+                    buffer = json_file.read(chunk_size)
+                    position = 0
+                    if not buffer:
+                        raise ValueError("Chyba při načítání JSON dat.")
+                    continue
+                character = buffer[position]
+                if expected == "[":
+                    if character != "[":
+                        raise ValueError("Chyba při načítání JSON dat.")
+                    position += 1
+                    expected = "value or ]"
+                    continue
+                if character == "]" and expected != "value":
+                    # Like json.load, allow only whitespace after the array
+                    rest = buffer[position + 1:]
+                    while True:
+                        if rest and not rest.isspace():
+                            raise ValueError("Chyba při načítání JSON dat.")
+                        rest = json_file.read(chunk_size)
+                        if not rest:
+                            return
+                if expected == "separator":
+                    if character != ",":
+                        raise ValueError("Chyba při načítání JSON dat.")
+                    position += 1
+                    expected = "value"
+                    continue
+                # Decode one array element, reading more data if it is incomplete
+                try:
+                    book_entry, end = decoder.raw_decode(buffer, position)
+                    complete = end < len(buffer)
+                except json.JSONDecodeError as err:
+                    book_entry, complete = err, False
+                if not complete:
+                    # Read at least as much as is buffered, so a huge record
+                    # is decoded a logarithmic number of times
+                    chunk = json_file.read(max(chunk_size, len(buffer) - position))
+                    if chunk:
+                        buffer = buffer[position:] + chunk
+                        position = 0
+                        continue
+                    if isinstance(book_entry, json.JSONDecodeError):
+                        raise ValueError("Chyba při načítání JSON dat.") from book_entry
+                position = end
+                expected = "separator"
+                yield book_entry
+
+    @staticmethod
+    def books_from_records(records, current_year: int = None):
+        # Validate and normalize book records against BOOK_SCHEMA in one pass.
+        # Returns the books, or raises LibraryLoadError listing every invalid
+        # field of every record, so no caller ever sees a partial result.
+        if current_year is None:
+            current_year = datetime.datetime.now().year
+        books = []
+        errors = []
+        # Consecutive records of the same type form a run decoded with one
+        # registry lookup
+        for type_tag, run in itertools.groupby(enumerate(records, start=1), key=_record_type):
+            registered = BOOK_TYPES.get(type_tag)
+            if registered is None:
+                for record_number, record in run:
+                    if isinstance(record, dict):
+                        errors.append((record_number, "type", f"Neznámý typ knihy: {record.get('type')}"))
+                    else:
+                        errors.append((record_number, None, "Záznam musí být objekt."))
+                continue
+            book_class, schema = registered
+            fields = tuple(schema.items())
+            for record_number, record in run:
+                values, record_errors = _coerce_fields(fields, record, current_year)
+                if record_errors:
+                    errors.extend((record_number, field, message) for field, message in record_errors)
+                else:
+                    books.append(book_class(**values))
+        if errors:
+            raise LibraryLoadError(errors)
+        return books
+
+    @staticmethod
+    def parse_from_json(file_path: str):
+        # Validate all records first, the library is filled only if all of them are valid
+        with _gc_paused():
+            books = Library.books_from_records(Library.iter_records_from_json(file_path))
+            new_library = Library()
+            new_library.add_books(books)
         return new_library
 
+    def save_binary(self, file_path: str):
+        # Atomically write the catalog as a binary snapshot (see MappedCatalog)
+        books = self.books
+        records, heap = _encode_binary(books)
+        with _atomic_open(file_path, "wb") as binary_file:
+            binary_file.write(_BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, _BINARY_RECORD.size, len(books)))
+            binary_file.write(records)
+            binary_file.write(heap)
+
+    @staticmethod
+    def load_binary(file_path: str):
+        # Load a whole binary snapshot into a new Library
+        with _gc_paused(), MappedCatalog(file_path) as catalog:
+            new_library = Library()
+            new_library.add_books(catalog)
+        return new_library
+
+
+class MappedCatalog:
+    # Read-only view of a binary snapshot written by Library.save_binary. The
+    # file is memory-mapped, opening it reads only the header and a book is
+    # decoded only when it is accessed. Books are decoded as new objects that
+    # do not belong to any library.
+
+    def __init__(self, file_path: str):
+        with open(file_path, "rb") as binary_file:
+            self._mapped_file = mmap.mmap(binary_file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if len(self._mapped_file) < _BINARY_HEADER.size:
+                raise ValueError("Neplatný binární snapshot knihovny.")
+            magic, version, record_size, count = _BINARY_HEADER.unpack_from(self._mapped_file)
+            self._heap_start = _BINARY_HEADER.size + record_size * count
+            if (magic != BINARY_MAGIC or version != BINARY_VERSION or record_size != _BINARY_RECORD.size
+                    or len(self._mapped_file) < self._heap_start):
+                raise ValueError("Neplatný binární snapshot knihovny.")
+        except ValueError:
+            self._mapped_file.close()
+            raise
+        self._count = count
+        # Decoded strings by heap offset, repeated authors are decoded once
+        self._strings = {}
+
+    def __len__(self):
+        return self._count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._mapped_file.close()
+        self._strings = {}
+
+    def _string(self, offset: int, length: int):
+        if not length:
+            return ""
+        text = self._strings.get(offset)
+        if text is None:
+            start = self._heap_start + offset
+            text = self._strings[offset] = self._mapped_file[start:start + length].decode("utf-8")
+        return text
+
+    def _decode(self, fields):
+        (type_id, flags, year, title_offset, title_length, author_offset, author_length,
+         format_offset, format_length, duration) = fields
+        title = self._string(title_offset, title_length)
+        author = self._string(author_offset, author_length)
+        available = bool(flags & _BINARY_AVAILABLE)
+        if type_id == 0:
+            return Book(title, author, year, available)
+        if type_id == 1:
+            return Ebook(title, author, year, self._string(format_offset, format_length), available)
+        if type_id != 2:
+            raise ValueError("Neplatný binární snapshot knihovny.")
+        if flags & _BINARY_INTEGER_DURATION:
+            duration = int(duration)
+        return AudioBook(title, author, year, duration, available)
+
+    def __getitem__(self, index: int):
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("Kniha s tímto číslem v katalogu není.")
+        fields = _BINARY_RECORD.unpack_from(self._mapped_file, _BINARY_HEADER.size + index * _BINARY_RECORD.size)
+        return self._decode(fields)
+
+    def __iter__(self):
+        # Decode the records in order, straight from the mapped record table
+        records = memoryview(self._mapped_file)[_BINARY_HEADER.size:self._heap_start]
+        try:
+            for fields in _BINARY_RECORD.iter_unpack(records):
+                yield self._decode(fields)
+        finally:
+            records.release()
+
+
+class _ReadWriteLock:
+    # Many concurrent readers or a single writer; waiting writers block new
+    # readers so catalog mutations are not starved. Not reentrant.
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+
+    @contextlib.contextmanager
+    def read(self):
+        with self._condition:
+            while self._writer or self._waiting_writers:
+                self._condition.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._readers -= 1
+                if self._readers == 0:
+                    self._condition.notify_all()
+
+    @contextlib.contextmanager
+    def write(self):
+        with self._condition:
+            self._waiting_writers += 1
+            while self._writer or self._readers:
+                self._condition.wait()
+            self._waiting_writers -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._writer = False
+                self._condition.notify_all()
+
+
+class ConcurrentLibrary(Library):
+    # Thread-safe Library. Borrowing and returning only take a striped
+    # per-book lock, so checkouts of different books run in parallel.
+    # Catalog mutations take the writer side of a reader-writer lock, and
+    # listings iterate over a snapshot taken under the reader side.
+
+    def __init__(self, lock_stripes: int = 64):
+        super().__init__()
+        self._catalog_lock = _ReadWriteLock()
+        self._stripes = [threading.Lock() for _ in range(lock_stripes)]
+        # Guards the two availability dicts, which are updated from many stripes
+        self._availability_lock = threading.Lock()
+
+    def _stripe_index(self, book: Book):
+        return hash(book) % len(self._stripes)
+
+    def _lock_for(self, book: Book):
+        return self._stripes[self._stripe_index(book)]
+
+    @property
+    def books(self):
+        with self._catalog_lock.read():
+            return list(self._catalog)
+
+    def __len__(self):
+        with self._catalog_lock.read():
+            return len(self._catalog)
+
+    def __iter__(self):
+        # Iterate over a snapshot, so concurrent mutations cannot break the loop
+        return iter(self.books)
+
+    def add_book(self, book: Book):
+        with self._catalog_lock.write():
+            super().add_book(book)
+
+    def add_books(self, books):
+        # Take the writer lock once for the whole batch
+        with self._catalog_lock.write():
+            super().add_books(books)
+
+    def remove_book(self, book: Book):
+        # Also hold the book's stripe and the availability index, so a
+        # concurrent borrow or return cannot put the removed book back
+        with self._catalog_lock.write(), self._lock_for(book), self._availability_lock:
+            super().remove_book(book)
+
+    def _availability_changed(self, book: Book):
+        with self._availability_lock:
+            # A book removed in the meantime is no longer indexed here
+            if book._library is self:
+                super()._availability_changed(book)
+
+    def _change_many(self, books, allowed_books: dict, available: bool, conflict_message: str, done_message: str):
+        # Hold the stripes of all books in the basket, taken in a fixed order
+        # to avoid deadlocks, so validation and update happen atomically
+        books = list(books)
+        stripe_indexes = sorted({self._stripe_index(book) for book in books})
+        with self._catalog_lock.read(), contextlib.ExitStack() as stack:
+            for stripe_index in stripe_indexes:
+                stack.enter_context(self._stripes[stripe_index])
+            return super()._change_many(books, allowed_books, available, conflict_message, done_message)
+
+    def find_by_title(self, title: str):
+        with self._catalog_lock.read():
+            return super().find_by_title(title)
+
+    def find_by_author(self, author: str):
+        with self._catalog_lock.read():
+            return super().find_by_author(author)
+
+    def find_by_year(self, year: int):
+        with self._catalog_lock.read():
+            return super().find_by_year(year)
+
+    def books_between_years(self, start_year: int, end_year: int):
+        with self._catalog_lock.read():
+            return super().books_between_years(start_year, end_year)
+
+    def _ordered_slice(self, offset: int, limit, sort_key):
+        with self._catalog_lock.read():
+            return super()._ordered_slice(offset, limit, sort_key)
+
+    def available_books(self):
+        with self._availability_lock:
+            return super().available_books()
+
+    def borrowed_books(self):
+        with self._availability_lock:
+            return super().borrowed_books()
+
+
+# Words of titles and authors used by the search index
+_WORD_PATTERN = re.compile(r"\w+")
+
+
+def _fold_text(text: str):
+    # Casefold and strip diacritics, so "capek" matches "Čapek"
+    decomposed_text = unicodedata.normalize("NFKD", str(text).casefold())
+    return "".join(character for character in decomposed_text if not unicodedata.combining(character))
+
+
+class SearchIndex:
+    # Full-text inverted index over the words of book titles and authors,
+    # folded for case and diacritics. It follows the library it is attached
+    # to through the library listeners.
+
+    def __init__(self, library: Library = None):
+        # Folded word -> books containing it (dict used as an ordered set)
+        self._postings = {}
+        # Sorted distinct words, used for prefix search
+        self._words = []
+        # Words of each indexed book, needed to remove it again
+        self._book_words = {}
+        if library is not None:
+            self.attach(library)
+
+    def attach(self, library: Library):
+        # Index the current catalog and follow its future changes
+        for book in library:
+            self._add(book)
+        library.add_listener(self._on_library_change)
+
+    def _on_library_change(self, event: str, book: Book):
+        if event == "add":
+            self._add(book)
+        elif event == "remove":
+            self._remove(book)
+
+    def _add(self, book: Book):
+        words = set(_WORD_PATTERN.findall(_fold_text(book.title) + " " + _fold_text(book.author)))
+        self._book_words[book] = words
+        for word in words:
+            if word not in self._postings:
+                bisect.insort(self._words, word)
+            _index_add(self._postings, word, book)
+
+    def _remove(self, book: Book):
+        for word in self._book_words.pop(book, ()):
+            if _index_discard(self._postings, word, book):
+                del self._words[bisect.bisect_left(self._words, word)]
+
+    def _prefix_words(self, prefix: str):
+        first = bisect.bisect_left(self._words, prefix)
+        last = bisect.bisect_left(self._words, prefix + "\U0010ffff")
+        return self._words[first:last]
+
+    def search(self, query: str, prefix: bool = True, limit: int = None):
+        # Return books containing all words of the query. With prefix=True
+        # the last word may be incomplete (type-ahead search).
+        query_words = _WORD_PATTERN.findall(_fold_text(query))
+        if not query_words:
+            return []
+        prefix_word = query_words.pop() if prefix else None
+        exact_postings = []
+        for word in query_words:
+            postings = self._postings.get(word)
+            if postings is None:
+                return []
+            exact_postings.append(postings)
+        if not exact_postings:
+            # Only a prefix: merge the postings of all words starting with it
+            found_books = {}
+            for word in self._prefix_words(prefix_word):
+                found_books.update(self._postings[word])
+                if limit is not None and len(found_books) >= limit:
+                    break
+            return list(found_books)[:limit]
+        # Walk the smallest posting list and check the others by membership
+        exact_postings.sort(key=len)
+        found_books = []
+        for book in exact_postings[0]:
+            if not all(book in postings for postings in exact_postings[1:]):
+                continue
+            if prefix_word is not None and not any(word.startswith(prefix_word) for word in self._book_words[book]):
+                continue
+            found_books.append(book)
+            if limit is not None and len(found_books) >= limit:
+                break
+        return found_books
+
+
+class LibraryJournal:
+    # Journaled storage: a JSON snapshot plus an append-only JSON Lines log
+    # of add/remove/borrow/return events. Saving appends only the events
+    # since the last save; the log is compacted into a new snapshot once it
+    # holds compact_after events.
+
+    def __init__(self, snapshot_path: str, log_path: str, compact_after: int = 1000):
+        self.snapshot_path = snapshot_path
+        self.log_path = log_path
+        self.compact_after = compact_after
+        self.library = None
+        # Journal IDs of the books, assigned in catalog order
+        self._book_ids = {}
+        self._next_id = 0
+        # Events recorded since the last save and events already in the log
+        self._pending = []
+        self._logged_events = 0
+        # Set when a compaction failed after the book IDs were renumbered,
+        # from then on only a new snapshot can record the state
+        self._compaction_required = False
+
+    def _snapshot_stamp(self):
+        # Identify the snapshot the log was started against
+        if not os.path.exists(self.snapshot_path):
+            return {"op": "base", "size": None, "mtime_ns": None}
+        stat_result = os.stat(self.snapshot_path)
+        return {"op": "base", "size": stat_result.st_size, "mtime_ns": stat_result.st_mtime_ns}
+
+    def _start_log(self):
+        # Atomically replace the log with an empty one bound to the current snapshot
+        with _atomic_open(self.log_path) as log_file:
+            log_file.write(json.dumps(self._snapshot_stamp()) + "\n")
+        self._logged_events = 0
+
+    def open(self):
+        # Rebuild the library from the snapshot and replay the log on top of it
+        if os.path.exists(self.snapshot_path):
+            library = Library.parse_from_json(self.snapshot_path)
+        else:
+            library = Library()
+        self._book_ids = {book: book_id for book_id, book in enumerate(library)}
+        self._next_id = len(self._book_ids)
+        if not self._replay(library):
+            self._start_log()
+        library.add_listener(self._record)
+        self.library = library
+        return library
+
+    def _replay(self, library: Library):
+        # Apply the logged events; returns False if the log has to be restarted
+        if not os.path.exists(self.log_path):
+            return False
+        books_by_id = {book_id: book for book, book_id in self._book_ids.items()}
+        current_year = datetime.datetime.now().year
+        with open(self.log_path, "rb") as log_file:
+            header = log_file.readline()
+            if not header.endswith(b"\n"):
+                return False
+            try:
+                if json.loads(header) != self._snapshot_stamp():
+                    # The log belongs to an older snapshot, which already contains its events
+                    return False
+            except json.JSONDecodeError:
+                return False
+            valid_size = log_file.tell()
+            for line in log_file:
+                # A line is complete only with its newline; a torn last line
+                # after a crash is dropped even if it happens to parse
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    event = json.loads(line)
+                except json.JSONDecodeError:
+                    break
+                self._apply(library, books_by_id, event, current_year)
+                self._logged_events += 1
+                valid_size += len(line)
+        if valid_size < os.path.getsize(self.log_path):
+            os.truncate(self.log_path, valid_size)
+        return True
+
+    def _apply(self, library: Library, books_by_id: dict, event: dict, current_year: int):
+        operation = event["op"]
+        if operation == "add":
+            book, = Library.books_from_records([event["book"]], current_year)
+            library.add_book(book)
+            books_by_id[event["id"]] = book
+            self._book_ids[book] = event["id"]
+            self._next_id = max(self._next_id, event["id"] + 1)
+            return
+        book = books_by_id[event["id"]]
+        if operation == "remove":
+            library.remove_book(book)
+            del books_by_id[event["id"]]
+            del self._book_ids[book]
+        elif operation == "borrow":
+            book.available = False
+        elif operation == "return":
+            book.available = True
+        else:
+            raise ValueError(f"Neznámá událost v žurnálu: {operation}")
+
+    def _record(self, event: str, book: Book):
+        # Library listener, queues the change for the next save
+        if event == "add":
+            self._book_ids[book] = self._next_id
+            self._pending.append({"op": "add", "id": self._next_id, "book": book.to_dict()})
+            self._next_id += 1
+        elif event == "remove":
+            self._pending.append({"op": "remove", "id": self._book_ids.pop(book)})
+        else:
+            self._pending.append({"op": event, "id": self._book_ids[book]})
+
+    def save(self):
+        # Append the pending events to the log, compact it once it grows too long
+        write_changes = self.prepare_save()
+        write_changes()
+
+    def compact(self):
+        # Write the current state as a new snapshot and start an empty log
+        write_snapshot = self._prepare_compaction()
+        write_snapshot()
+
+    @contextlib.contextmanager
+    def bulk_changes(self):
+        # Stop journaling while the block changes the library in bulk (e.g.
+        # an import) and compact afterwards: one snapshot is cheaper than a
+        # queued event per book. Compacts even if the block fails, so the
+        # snapshot matches the partially changed library.
+        self.library.remove_listener(self._record)
+        try:
+            yield
+        finally:
+            self.library.add_listener(self._record)
+            self.compact()
+
+    def prepare_save(self):
+        # Capture everything the next save has to write and return a function
+        # doing the file I/O, which may then run in another thread while the
+        # library keeps changing. The returned functions must run in order.
+        if self._compaction_required or self._logged_events + len(self._pending) >= self.compact_after:
+            return self._prepare_compaction()
+        events = self._pending
+        lines = [json.dumps(event, ensure_ascii=False) + "\n" for event in events]
+        self._logged_events += len(events)
+        self._pending = []
+        return functools.partial(self._append_to_log, "".join(lines), events)
+
+    def _prepare_compaction(self):
+        books = list(self.library)
+        books_dictionaries = _encode_books(books)
+        self._book_ids = {book: book_id for book_id, book in enumerate(books)}
+        self._next_id = len(self._book_ids)
+        self._pending = []
+        self._logged_events = 0
+        self._compaction_required = False
+        return functools.partial(self._write_snapshot, books_dictionaries)
+
+    def _append_to_log(self, data: str, events: list):
+        if not data:
+            return
+        log_size = None
+        try:
+            with open(self.log_path, "a", encoding="utf-8") as log_file:
+                log_size = log_file.tell()
+                log_file.write(data)
+                log_file.flush()
+                os.fsync(log_file.fileno())
+        except BaseException:
+            # Cut off a partially written tail and keep the events for the
+            # next save, so later events never refer to unlogged ones
+            if log_size is not None:
+                with contextlib.suppress(OSError):
+                    os.truncate(self.log_path, log_size)
+            self._pending[:0] = events
+            self._logged_events -= len(events)
+            raise
+
+    def _write_snapshot(self, books_dictionaries: list):
+        try:
+            _write_json_file(self.snapshot_path, books_dictionaries)
+            self._start_log()
+        except BaseException:
+            # The book IDs were already renumbered for the new snapshot, so
+            # the old log cannot be continued; the next save compacts again
+            self._compaction_required = True
+            raise
+
+
+class BackgroundSaver:
+    # Write-behind saving of a Library with save_in_json. request_save()
+    # returns at once; a background thread waits `delay` seconds so that a
+    # burst of requests is coalesced into one save, then saves. Saving an
+    # unchanged library is skipped by save_in_json itself.
+
+    def __init__(self, library: Library, file_path: str, delay: float = 0.5):
+        self.library = library
+        self.file_path = file_path
+        self.delay = delay
+        self._condition = threading.Condition()
+        self._requested = False
+        self._saving = False
+        self._closed = False
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name="LibrarySaver", daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def request_save(self):
+        with self._condition:
+            if self._closed:
+                raise ValueError("Ukládání na pozadí je již ukončené.")
+            self._requested = True
+            self._condition.notify_all()
+
+    def flush(self):
+        # Wait until every requested save is written; re-raises a failed save
+        with self._condition:
+            self._condition.wait_for(lambda: not self._requested and not self._saving)
+            error, self._error = self._error, None
+        if error is not None:
+            raise error
+
+    def close(self):
+        # Write the pending save right away and stop the thread
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join()
+        self.flush()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._requested or self._closed)
+                if not self._requested:
+                    return
+                # Coalescing window, cut short by close()
+                self._condition.wait_for(lambda: self._closed, timeout=self.delay)
+                self._requested = False
+                self._saving = True
+            try:
+                self.library.save_in_json(self.file_path)
+            except Exception as error:
+                self._error = error
+            finally:
+                with self._condition:
+                    self._saving = False
+                    self._condition.notify_all()
+
+
+class LibraryService:
+    # asyncio front-end serving one Library to many clients over a TCP line
+    # protocol. Every request is one line, every answer ends with a line
+    # starting with "OK" or "ERR":
+    #   list | add title;author;year | remove N | borrow N | return N | save | quit
+    # N is the number of the book as shown by "list". All library access
+    # happens on the event loop; only the file I/O of saves runs in a thread.
+
+    def __init__(self, library: Library, journal: LibraryJournal = None, file_path: str = None):
+        self.library = library
+        self.journal = journal
+        self.file_path = file_path
+        self._save_requested = None
+        self._saver_task = None
+        # Set when the service stops, the saver then makes the final save
+        self._stopping = False
+        # Error of the last failed background save, reported by "save"
+        self._save_error = None
+        # Books in catalog order for the book numbers of requests, rebuilt
+        # only after the catalog changes rather than copied per request
+        self._numbered_books = None
+        library.add_listener(self._on_library_change)
+
+    async def serve(self, host: str, port: int):
+        self._save_requested = asyncio.Event()
+        self._saver_task = asyncio.create_task(self._saver())
+        server = await asyncio.start_server(self._handle_client, host, port)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            # The saver is not cancelled: a cancelled to_thread() would leave
+            # its save running in the thread next to the final one
+            self._stopping = True
+            self._save_requested.set()
+            await self._saver_task
+
+    def request_save(self):
+        # Repeated requests before the saver runs are coalesced into one save
+        self._save_requested.set()
+
+    def _prepare_save(self):
+        if self.journal is not None:
+            return self.journal.prepare_save()
+        books_dictionaries = _encode_books(self.library)
+        return functools.partial(_write_json_file, self.file_path, books_dictionaries)
+
+    async def _saver(self):
+        # Saves run one at a time, in the order they were prepared
+        while True:
+            await self._save_requested.wait()
+            self._save_requested.clear()
+            if self._stopping:
+                # Persist whatever changed before the service stops
+                await asyncio.to_thread(self._prepare_save())
+                return
+            try:
+                await asyncio.to_thread(self._prepare_save())
+            except Exception as err:
+                # Keep the saver running, the next request retries the save
+                self._save_error = err
+                print(f"Uložení knihovny selhalo: {err}", file=sys.stderr)
+            else:
+                self._save_error = None
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    text = line.decode("utf-8")
+                except UnicodeDecodeError:
+                    writer.write("ERR Požadavek musí být v kódování UTF-8.\n".encode("utf-8"))
+                    await writer.drain()
+                    continue
+                command, _, argument = text.strip().partition(" ")
+                command = command.lower()
+                if command == "quit":
+                    writer.write("OK Na shledanou.\n".encode("utf-8"))
+                    break
+                try:
+                    answer = self._execute(command, argument.strip())
+                except ValueError as err:
+                    answer = f"ERR {err}\n"
+                writer.write(answer.encode("utf-8"))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def _book_by_number(self, argument: str):
+        try:
+            book_number = int(argument)
+        except ValueError as err:
+            raise ValueError("Číslo knihy musí být číslo.") from err
+        if self._numbered_books is None:
+            self._numbered_books = self.library.books
+        if not 1 <= book_number <= len(self._numbered_books):
+            raise ValueError("Neplatné číslo knihy.")
+        return self._numbered_books[book_number - 1]
+
+    def _on_library_change(self, event: str, book: Book):
+        # Adding or removing a book renumbers the catalog
+        if event in ("add", "remove"):
+            self._numbered_books = None
+
+    def _execute(self, command: str, argument: str):
+        if command == "list":
+            return "".join(self.library.iter_rendered()) + "OK\n"
+        if command == "add":
+            self.library.add_book(Book.parse_from_string(argument))
+            return "OK Kniha byla přidána.\n"
+        if command == "remove":
+            self.library.remove_book(self._book_by_number(argument))
+            return "OK Kniha byla odstraněna.\n"
+        if command == "borrow":
+            self._book_by_number(argument).borrow()
+            return "OK Kniha byla vypůjčena.\n"
+        if command == "return":
+            self._book_by_number(argument).return_book()
+            return "OK Kniha byla vrácena.\n"
+        if command == "save":
+            self.request_save()
+            if self._save_error is not None:
+                return f"ERR Předchozí uložení selhalo ({self._save_error}), opakuje se.\n"
+            return "OK Uložení bylo naplánováno.\n"
+        raise ValueError("Neznámý příkaz. (list, add, remove, borrow, return, save, quit)")
+
+
+def stress_concurrent_library(threads: int = 8, books: int = 100, operations: int = 20000, basket_size: int = 3,
+                              seed: int = 0, switch_interval: float = 1e-6):
+    # Let threads borrow and return random books of a ConcurrentLibrary, one
+    # at a time and in baskets, and check that no book is ever lent twice.
+    # Every successful borrow marks the book in a separately locked ledger,
+    # which must show it free. Meanwhile another thread keeps removing and
+    # re-adding books, a removed book must stay out of the availability
+    # index. Threads switch every switch_interval seconds during the run, so
+    # races show up. Returns a report dictionary, raises AssertionError on a
+    # double lend or an inconsistent library.
+    library = ConcurrentLibrary()
+    library.add_books([Book(f"Kniha {number}", f"Autor {number % 10}", 1900 + number % 100) for number in range(books)])
+    catalog = library.books
+    ledger = dict.fromkeys(catalog, False)
+    ledger_lock = threading.Lock()
+    double_lends = []
+    resurrected_books = []
+    counts = collections.Counter()
+    stop_mutating = threading.Event()
+
+    def lend(borrowed_books):
+        with ledger_lock:
+            for book in borrowed_books:
+                if ledger[book]:
+                    double_lends.append(book)
+                ledger[book] = True
+
+    def release(borrowed_books):
+        with ledger_lock:
+            for book in borrowed_books:
+                ledger[book] = False
+
+    def worker(worker_seed: int):
+        generator = random.Random(worker_seed)
+        worker_counts = collections.Counter()
+        for _ in range(operations // threads):
+            if generator.random() < 0.5:
+                book = generator.choice(catalog)
+                try:
+                    book.borrow()
+                except ValueError:
+                    worker_counts["conflicts"] += 1
+                    continue
+                lend([book])
+                worker_counts["single"] += 1
+                release([book])
+                book.return_book()
+            else:
+                basket = generator.sample(catalog, basket_size)
+                results = library.borrow_many(basket)
+                if not all(success for _, success, _ in results):
+                    worker_counts["conflicts"] += 1
+                    continue
+                lend(basket)
+                worker_counts["baskets"] += 1
+                release(basket)
+                if not all(success for _, success, _ in library.return_many(basket)):
+                    # A book of the basket was removed meanwhile, return them one by one
+                    for book in basket:
+                        book.return_book()
+        return worker_counts
+
+    def mutator(worker_seed: int):
+        generator = random.Random(worker_seed)
+        worker_counts = collections.Counter()
+        while not stop_mutating.is_set():
+            removed_books = generator.sample(catalog, len(catalog) // 4)
+            for book in removed_books:
+                library.remove_book(book)
+            # Give concurrent borrows of the removed books a chance to run
+            time.sleep(0.001)
+            indexed_books = set(library.available_books()) | set(library.borrowed_books())
+            resurrected_books.extend(book for book in removed_books if book in indexed_books)
+            library.add_books(removed_books)
+            worker_counts["removals"] += len(removed_books)
+        return worker_counts
+
+    original_switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(switch_interval)
+    started = time.perf_counter()
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=threads + 1) as executor:
+            mutator_future = executor.submit(mutator, seed + threads)
+            try:
+                for worker_counts in executor.map(worker, range(seed, seed + threads)):
+                    counts.update(worker_counts)
+            finally:
+                stop_mutating.set()
+            counts.update(mutator_future.result())
+    finally:
+        sys.setswitchinterval(original_switch_interval)
+    seconds = time.perf_counter() - started
+    if double_lends:
+        raise AssertionError(f"Knihy vypůjčené dvakrát: {len(double_lends)}.")
+    if resurrected_books:
+        raise AssertionError(f"Odstraněné knihy zůstaly v indexu dostupnosti: {len(resurrected_books)}.")
+    if (len(library) != books or len(library.available_books()) != books or library.borrowed_books()
+            or not all(book.available for book in catalog)):
+        raise AssertionError("Stav dostupnosti knih neodpovídá po vrácení všech výpůjček.")
+    return {
+        "single": counts["single"],
+        "baskets": counts["baskets"],
+        "conflicts": counts["conflicts"],
+        "removals": counts["removals"],
+        "seconds": seconds,
+    }
+
+
+def _linear_search(library: Library, query: str):
+    # Reference search without an index, same matching rules as
+    # SearchIndex.search with prefix=True: every book is folded per query
+    query_words = _WORD_PATTERN.findall(_fold_text(query))
+    if not query_words:
+        return []
+    exact_words, prefix_word = set(query_words[:-1]), query_words[-1]
+    found_books = []
+    for book in library:
+        words = set(_WORD_PATTERN.findall(_fold_text(book.title) + " " + _fold_text(book.author)))
+        if exact_words <= words and any(word.startswith(prefix_word) for word in words):
+            found_books.append(book)
+    return found_books
+
+
+def benchmark_search(books: int = 20000, queries: int = 20, seed: int = 0):
+    # Compare a linear scan of the catalog with SearchIndex on a generated
+    # catalog, check that both find the same books and print the times
+    generator = random.Random(seed)
+    title_words = ["Válka", "mír", "zámek", "Krakatit", "hora", "noc", "příběh", "město", "cesta", "řeka"]
+    author_names = ["Čapek", "Němcová", "Hašek", "Kundera", "Škvorecký", "Erben", "Neruda", "Havel"]
+    library = Library()
+    library.add_books([Book(" ".join(generator.sample(title_words, 3)) + f" {number}",
+                            generator.choice(author_names), 1800 + number % 200) for number in range(books)])
+    index = SearchIndex(library)
+    query_texts = [generator.choice(["capek", "nemc", "valka zam", "reka hasek", "pribeh", "mesto kund"])
+                   for _ in range(queries)]
+    started = time.perf_counter()
+    linear_results = [_linear_search(library, query) for query in query_texts]
+    linear_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    index_results = [index.search(query) for query in query_texts]
+    index_seconds = time.perf_counter() - started
+    for query, linear_books, index_books in zip(query_texts, linear_results, index_results):
+        if set(linear_books) != set(index_books):
+            raise AssertionError(f"Index a lineární prohledávání se liší pro dotaz '{query}'.")
+    print(f"⏱️ Lineární prohledávání ({books} knih): {linear_seconds / queries * 1e3:.2f} ms/dotaz")
+    print(f"⏱️ SearchIndex: {index_seconds / queries * 1e3:.2f} ms/dotaz "
+          f"({linear_seconds / index_seconds if index_seconds else float('inf'):.0f}× rychleji)")
+
 
 # Define the JSON file path for storing and reading book data
 JSON_FILE_PATH = "json/library.json"
+# Append-only log of changes made since the last snapshot in JSON_FILE_PATH
+JOURNAL_FILE_PATH = "json/library.journal.jsonl"
+# Address of the library service started with the --serve option
+SERVICE_HOST = "127.0.0.1"
+SERVICE_PORT = 8765
 
 
 if __name__ == "__main__":
+    if "--stress" in sys.argv:
+        # Concurrent checkouts against a ConcurrentLibrary, the data files are not touched
+        report = stress_concurrent_library()
+        print(f"Zátěžový test: {report['single']} výpůjček, {report['baskets']} košíků, "
+              f"{report['conflicts']} kolizí, {report['removals']} odebrání a vrácení do katalogu "
+              f"za {report['seconds']:.2f} s, žádná kniha nebyla vypůjčena dvakrát.")
+        sys.exit(0)
+
+    if "--benchmark" in sys.argv:
+        # Linear scan versus SearchIndex on a generated catalog
+        benchmark_search()
+        sys.exit(0)
+
     # Clear the console screen based on the operating system
     if os.name == "posix":
         os.system("clear")
     else:
         os.system("cls")
 
-    library = Library.parse_from_json(JSON_FILE_PATH)
+    journal = LibraryJournal(JSON_FILE_PATH, JOURNAL_FILE_PATH)
+    try:
+        library = journal.open()
+    except LibraryLoadError as error:
+        print(error)
+        print(error.report())
+        sys.exit(1)
+
+    if "--serve" in sys.argv:
+        # Serve the library to network clients instead of the interactive REPL
+        print(f"Knihovna naslouchá na {SERVICE_HOST}:{SERVICE_PORT} (ukončení Ctrl+C).")
+        try:
+            asyncio.run(LibraryService(library, journal).serve(SERVICE_HOST, SERVICE_PORT))
+        except KeyboardInterrupt:
+            pass
+        sys.exit(0)
+
+    if "--import" in sys.argv[1:-1]:
+        # Bulk import of a "title;author;year" file given after --import,
+        # parsed in this process unless "--workers N" asks for a process pool
+        import_path = sys.argv[sys.argv.index("--import") + 1]
+        import_workers = 0
+        if "--workers" in sys.argv[1:-1]:
+            try:
+                import_workers = int(sys.argv[sys.argv.index("--workers") + 1])
+            except ValueError:
+                print("Počet procesů (--workers) musí být číslo.")
+                sys.exit(2)
+        with journal.bulk_changes():
+            report = library.import_books(import_path, import_path + ".rejected", workers=import_workers)
+        print(f"Importováno {report['imported']} knih, odmítnuto {report['rejected']} řádků "
+              f"({report['rows_per_second']:.0f} řádků/s).")
+        if report["rejected"]:
+            print(f"Odmítnuté řádky jsou v souboru {import_path}.rejected.")
+        sys.exit(0)
 
     print("\033[1;32m--- Seznam knih v knihovně: ---\033[0m\n")
     library.list_books()
@@ -199,7 +1929,15 @@ if __name__ == "__main__":
             print("\n")
             user_new_book_title = input("Zadejte název nové knihy: ")
             user_new_book_author = input("Zadejte autora nové knihy: ")
-            user_new_book_year = input("Zadejte rok vzniku nové knihy: ")
+            while True:
+                try:
+                    user_new_book_year = int(input("Zadejte rok vzniku nové knihy: "))
+                except ValueError:
+                    print("Rok knihy musí být číslo.")
+                    continue
+                if Book.is_valid_year(user_new_book_year):
+                    break
+                print("Rok knihy není platný.")
             while True:
                 user_new_book_available = input("Je kniha dostupná? (Y/n): ")
                 if user_new_book_available.lower() == "y" or "n" or "":
@@ -209,8 +1947,13 @@ if __name__ == "__main__":
             else: 
                 user_new_book_available = True
 
-            new_book = Book(user_new_book_title, user_new_book_author, user_new_book_year, user_new_book_available)
-            library.add_book(new_book)
+            try:
+                new_book = Book.from_record({"title": user_new_book_title, "author": user_new_book_author,
+                                             "year": user_new_book_year, "available": user_new_book_available})
+            except ValueError as error:
+                print(f"Kniha nebyla přidána: {error}")
+            else:
+                library.add_book(new_book)
         
         if user_choice.lower() == "remove":
             print("\n")
@@ -222,7 +1965,7 @@ if __name__ == "__main__":
                 except ValueError:
                     print("\nVámi vybraná hodnota musí být číslo.\n")
 
-            if 0 <= remove_book_index <= len(library.books):
+            if 1 <= remove_book_index <= len(library):
                 book_to_remove = library.books[remove_book_index - 1]
                 library.remove_book(book_to_remove)
                 print("Kniha byla odstraněna.")
@@ -230,7 +1973,7 @@ if __name__ == "__main__":
                 print("Neplatné číslo knihy.")
 
         if user_choice.lower() == "save":
-            library.save_in_json(JSON_FILE_PATH)
+            journal.save()
 
         if user_choice.lower() == "quit":
             break
\ No newline at end of file
@@ -18,11 +18,18 @@ logování volání metod tříd `Auto` a `Letadlo`.
 
 2. **Globální přepínač logování**:
     - Definujeme globální proměnnou `LOG_ENABLED`, která umožňuje zapnout nebo vypnout logování.
+    - Vzory `LOG_INCLUDE` a `LOG_EXCLUDE` určují, které metody metatřída obalí (modul `log_instrumentation`).
 
 3. **Funkce pro logování**:
-    - `log_message(message)`: Zapíše zprávu do logovacího souboru, pokud je logování povoleno.
+    - `log_message(message)`: Předá zprávu na pozadí běžícímu zapisovači `AsyncLogWriter`, pokud je logování povoleno.
+      Zapisovač drží soubor otevřený a zapisuje zprávy v dávkách. Soubor se rotuje podle velikosti
+      a stáří, starší segmenty se na pozadí komprimují (modul `log_rotation`).
     - `enable_logging()`: Zapne logování a zapíše tuto akci do logu.
-    - `disable_logging()`: Vypne logování a zapíše tuto akci do logu.
+    - `disable_logging()`: Vypne logování a zapíše tuto akci do logu. Obalené metody se ve třídách
+      nahradí původními funkcemi, takže vypnuté logování nepřidává k volání žádnou režii.
+    - `benchmark_call_overhead()`: Změří režii volání (spuštění skriptu s parametrem `--benchmark`).
+    - Volání přes `super()` v hierarchii tříd (stejná metoda téhož objektu) se loguje jen jednou,
+      na nejvyšší úrovni, argumenty se zapisují zkrácené podle `ARG_REPR`.
 
 4. **Zaznamenání startu skriptu**:
     - Při spuštění skriptu zaznamenáme tuto událost do logu.
@@ -50,9 +57,21 @@ a pochopit, jak by mohly být metatřídy využity k automatizaci opakujících
 jako je logování.
 """
 
+import atexit
+import collections
 import os
+import queue
+import reprlib
+import sys
+import threading
+import time
+import timeit
+import weakref
 from datetime import datetime
 
+from log_instrumentation import class_patterns, instrument_attribute, mark_wrapper, should_instrument
+from log_rotation import RotatingLogFile
+
 # Nastavení relativní cesty k logu
 LOG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "log")  # Relativní cesta k adresáři /log
 LOG_FILE = os.path.join(LOG_DIR, "method_calls_1.log")  # Plná cesta k logovacímu souboru
@@ -64,16 +83,162 @@ if not os.path.exists(LOG_DIR):
 # Globální přepínač logování
 LOG_ENABLED = True  # Lze zapnout/vypnout voláním enable_logging() / disable_logging()
 
-def log_message(message):
-    """Zapíše zprávu do logovacího souboru, pokud je logování povoleno."""
+# Výběr metod k logování (vzory fnmatch), třída je může změnit atributy __log_include__
+# a __log_exclude__, jednotlivé metody dekorátory @log_always a @no_log z log_instrumentation
+LOG_INCLUDE = ("*",)
+LOG_EXCLUDE = ("_*",)  # Soukromé metody a dunder metody se neobalují
+
+# Dávkový zápis logu
+LOG_FLUSH_INTERVAL = 0.5  # Nejdéle po kolika sekundách se zprávy z fronty zapíší do souboru
+LOG_BATCH_SIZE = 1000     # Po kolika nashromážděných zprávách se zapisuje okamžitě
+
+# Rotace logu, starší segmenty čte funkce log_rotation.iter_log_lines(LOG_FILE)
+LOG_MAX_BYTES = 10 * 1024 * 1024  # Rotace po dosažení velikosti souboru
+LOG_ROTATE_INTERVAL = 24 * 3600   # Rotace nejpozději po tolika sekundách
+LOG_BACKUP_COUNT = 30             # Počet ponechaných rotovaných segmentů
+LOG_COMPRESSION = "gzip"          # Komprese segmentů: "gzip", "bz2", "lzma" nebo None
+
+# Omezení délky argumentů v záznamech volání, hodnoty lze měnit za běhu
+ARG_REPR = reprlib.Repr()
+ARG_REPR.maxlevel = 3     # Hloubka vnořených struktur
+ARG_REPR.maxlist = 10     # Počet vypsaných prvků seznamů, n-tic, množin a slovníků
+ARG_REPR.maxdict = 10
+ARG_REPR.maxstring = 120  # Délka řetězců
+ARG_REPR.maxother = 120   # Délka repr() ostatních objektů
+
+# Kontejnery mohou mít libovolně dlouhý repr(), zkracuje je reprlib
+_CONTAINER_TYPES = (list, tuple, dict, set, frozenset, collections.deque)
+
+
+def _short_repr(value):
+    """Vrátí repr() hodnoty zkrácený na ARG_REPR.maxstring / ARG_REPR.maxother znaků.
+
+    Vestavěná repr() je o řád rychlejší než reprlib, ten se proto používá jen pro kontejnery.
+    """
+    if isinstance(value, _CONTAINER_TYPES):
+        return ARG_REPR.repr(value)
+    try:
+        text = repr(value)
+    except Exception:
+        return f"<{type(value).__name__} instance at {id(value):#x}>"
+    limit = ARG_REPR.maxstring if type(value) is str else ARG_REPR.maxother
+    if len(text) > limit:
+        return text[:limit - 3] + "..."
+    return text
+
+
+def _repr_arguments(args, kwargs):
+    """Vrátí zkrácený zápis argumentů volání ve tvaru (args), {kwargs}."""
+    if len(args) == 1 and not kwargs:
+        # Nejčastější případ: metoda volaná jen se self
+        return f"({_short_repr(args[0])},), {{}}"
+    text = ", ".join(map(_short_repr, args))
+    text = f"({text},)" if len(args) == 1 else f"({text})"
+    if not kwargs:
+        return text + ", {}"
+    return text + ", {" + ", ".join(f"{key!r}: {_short_repr(value)}" for key, value in kwargs.items()) + "}"
+
+
+class AsyncLogWriter:
+    """Zapisuje zprávy do logovacího souboru v samostatném vlákně.
+
+    Volající vlákno zprávu jen vloží do fronty. Zapisovací vlákno drží soubor
+    otevřený, zprávy formátuje a zapisuje v dávkách, nejpozději po
+    `flush_interval` sekundách nebo po `batch_size` zprávách.
+    Argumenty zprávy se formátují až při zápisu (`message.format(*arguments)`), mají to tedy
+    být hotové hodnoty (řetězce, čísla). Zprávu, kterou nelze naformátovat, zapisovač zapíše
+    s popisem chyby a pokračuje dál.
+    S `rotate=True` se soubor rotuje a komprimuje podle nastavení LOG_MAX_BYTES a dalších.
+    """
+
+    _STOP = object()  # Značka ve frontě pro ukončení vlákna
+
+    def __init__(self, log_file, flush_interval=LOG_FLUSH_INTERVAL, batch_size=LOG_BATCH_SIZE, rotate=True):
+        self.log_file = log_file
+        self.rotate = rotate
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="AsyncLogWriter", daemon=True)
+        self._thread.start()
+
+    def write(self, message, *arguments):
+        """Vloží zprávu do fronty k zápisu."""
+        self._queue.put((time.time(), message, arguments))
+
+    def flush(self):
+        """Počká, až budou zapsány všechny dosud vložené zprávy."""
+        if self._thread.is_alive():
+            done = threading.Event()
+            self._queue.put(done)
+            done.wait()
+
+    def close(self):
+        """Zapíše zbývající zprávy a ukončí zapisovací vlákno."""
+        if self._thread.is_alive():
+            self._queue.put(self._STOP)
+            self._thread.join()
+
+    def _run(self):
+        last_second = None
+        timestamp = ""
+        if self.rotate:
+            log_file = RotatingLogFile(self.log_file, max_bytes=LOG_MAX_BYTES, rotate_interval=LOG_ROTATE_INTERVAL,
+                                       backup_count=LOG_BACKUP_COUNT, compression=LOG_COMPRESSION)
+        else:
+            log_file = open(self.log_file, "a", encoding="utf-8")
+        with log_file:
+            while True:
+                # Čekáme na první zprávu dávky, další sbíráme do vypršení intervalu
+                batch = [self._queue.get()]
+                deadline = time.monotonic() + self.flush_interval
+                while len(batch) < self.batch_size and not isinstance(batch[-1], threading.Event) and batch[-1] is not self._STOP:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(self._queue.get(timeout=remaining))
+                    except queue.Empty:
+                        break
+                lines = []
+                for item in batch:
+                    if isinstance(item, threading.Event) or item is self._STOP:
+                        continue
+                    created, message, arguments = item
+                    # Časové razítko má přesnost na sekundy, formátujeme ho jen jednou za sekundu
+                    if int(created) != last_second:
+                        last_second = int(created)
+                        timestamp = datetime.fromtimestamp(last_second).strftime('%Y-%m-%d %H:%M:%S')
+                    if arguments:
+                        try:
+                            message = message.format(*arguments)
+                        except Exception as error:
+                            message = f"{message} (chyba formátování: {error!r})"
+                    lines.append(f"{timestamp} - {message}\n")
+                log_file.write("".join(lines))
+                log_file.flush()
+                for item in batch:
+                    if isinstance(item, threading.Event):
+                        item.set()
+                if batch[-1] is self._STOP:
+                    return
+
+
+# Jediný zapisovač logu; při ukončení programu zapíše zbývající zprávy
+_log_writer = AsyncLogWriter(LOG_FILE)
+atexit.register(_log_writer.close)
+
+
+def log_message(message, *arguments):
+    """Předá zprávu k zápisu do logovacího souboru, pokud je logování povoleno."""
     if LOG_ENABLED:
-        with open(LOG_FILE, "a", encoding="utf-8") as log_file:
-            log_file.write(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} - {message}\n")
+        _log_writer.write(message, *arguments)
 
 def enable_logging():
     """Zapne logování."""
     global LOG_ENABLED
     LOG_ENABLED = True
+    MetaLogger.install_wrappers(True)
     print("✅ Logování povoleno.")
     log_message("✅ Logování povoleno.")
 
@@ -81,28 +246,78 @@ def disable_logging():
     """Vypne logování."""
     global LOG_ENABLED
     LOG_ENABLED = False
+    MetaLogger.install_wrappers(False)
     print("❌ Logování zakázáno.")
     log_message("❌ Logování zakázáno.")
 
 
+class _ActiveCalls(threading.local):
+    """Zásobník rozpracovaných volání (objekt, třída, metoda), každé vlákno má vlastní."""
+
+    def __init__(self):
+        self.frames = []
+
+
+_active_calls = _ActiveCalls()
+
+
 class MetaLogger(type):
-    """Metatřída, která automaticky přidává logování ke všem metodám třídy."""
+    """Metatřída, která automaticky přidává logování k metodám třídy vybraným pravidly."""
+
+    # Původní a obalené metody všech tříd vytvořených metatřídou: {třída: {název: (původní, obalená)}}
+    _wrapped_methods = weakref.WeakKeyDictionary()
 
     def __new__(cls, name, bases, dct):
-        """Obalí všechny metody logovací funkcí."""
+        """Obalí logovací funkcí metody vybrané pravidly (viz log_instrumentation)."""
+        include = class_patterns(dct, bases, "__log_include__", LOG_INCLUDE)
+        exclude = class_patterns(dct, bases, "__log_exclude__", LOG_EXCLUDE)
+        wrapped_methods = {}
         for attr_name, attr_value in dct.items():
-            if callable(attr_value) and not attr_name.startswith("__"):  # Pouze metody, ne dunder
-                dct[attr_name] = cls._log_method(attr_name, attr_value)
-        return super().__new__(cls, name, bases, dct)
+            if should_instrument(attr_name, attr_value, include, exclude):
+                wrapper, = instrument_attribute(attr_name, attr_value,
+                                                lambda method, method_name: (cls._log_method(name, method_name, method),))
+                wrapped_methods[attr_name] = (attr_value, wrapper)
+        for attr_name, (method, wrapper) in wrapped_methods.items():
+            dct[attr_name] = wrapper if LOG_ENABLED else method
+        new_class = super().__new__(cls, name, bases, dct)
+        MetaLogger._wrapped_methods[new_class] = wrapped_methods
+        return new_class
 
     @staticmethod
-    def _log_method(method_name, method):
-        """Obalí metodu tak, aby se logovala při každém volání."""
+    def install_wrappers(enabled):
+        """Vloží do všech tříd obalené metody (enabled=True), nebo vrátí původní funkce.
+
+        Při vypnutém logování tak volání metody nestojí nic navíc.
+        """
+        for logged_class, wrapped_methods in list(MetaLogger._wrapped_methods.items()):
+            for attr_name, (method, wrapper) in wrapped_methods.items():
+                type.__setattr__(logged_class, attr_name, wrapper if enabled else method)
+
+    @staticmethod
+    def _log_method(class_name, method_name, method):
+        """Obalí metodu tak, aby se logovala při každém volání.
+
+        Volání stejné metody téhož objektu přes super() se loguje jen jednou, na nejvyšší úrovni.
+        """
         def wrapper(*args, **kwargs):
-            if LOG_ENABLED:
-                log_message(f"METACLASS: {method_name}, Argumenty: {args}, {kwargs}")
-            return method(*args, **kwargs)
-        return wrapper
+            if not LOG_ENABLED:
+                return method(*args, **kwargs)
+            frames = _active_calls.frames
+            receiver = args[0] if args else None
+            if frames:
+                caller_receiver, caller_class_name, caller_method_name = frames[-1]
+                # Volání z přepsané metody potomka (super()) je pokračování už zalogovaného volání
+                if caller_receiver is receiver and caller_method_name == method_name and caller_class_name != class_name:
+                    return method(*args, **kwargs)
+            # repr argumentů vzniká hned ve volajícím vlákně (pozdější změny objektů ho neovlivní),
+            # zkrácený podle ARG_REPR (viz _short_repr)
+            _log_writer.write("METACLASS: {}, Argumenty: {}", method_name, _repr_arguments(args, kwargs))
+            frames.append((receiver, class_name, method_name))
+            try:
+                return method(*args, **kwargs)
+            finally:
+                frames.pop()
+        return mark_wrapper(wrapper)
 
 
 class Auto(metaclass=MetaLogger):
@@ -135,10 +350,43 @@ class Letadlo(metaclass=MetaLogger):
         log_message(f"📢 {self.name} přistálo!")
 
 
+def benchmark_call_overhead(calls=200_000):
+    """Změří dobu volání metody se zapnutým logováním, vypnutým logováním a bez metatřídy.
+
+    Zprávy se během měření zapisují do os.devnull, ne do logovacího souboru.
+    """
+    global LOG_ENABLED, _log_writer
+
+    class Logged(metaclass=MetaLogger):
+        def method(self):
+            pass
+
+    class Plain:
+        def method(self):
+            pass
+
+    logged, plain = Logged(), Plain()
+    original_enabled, original_writer = LOG_ENABLED, _log_writer
+    _log_writer = AsyncLogWriter(os.devnull, rotate=False)
+    try:
+        for label, enabled, instance in (("zapnuto", True, logged), ("vypnuto", False, logged), ("bez metatřídy", False, plain)):
+            LOG_ENABLED = enabled
+            MetaLogger.install_wrappers(enabled)
+            seconds = min(timeit.repeat(instance.method, number=calls, repeat=5))
+            print(f"⏱️ Logování {label}: {seconds / calls * 1e9:.0f} ns/volání")
+    finally:
+        _log_writer.close()
+        LOG_ENABLED, _log_writer = original_enabled, original_writer
+        MetaLogger.install_wrappers(LOG_ENABLED)
+
+
 # =============================================================================
 # =============================================================================
 
 if __name__ == "__main__":
+    if "--benchmark" in sys.argv:
+        benchmark_call_overhead()
+        sys.exit(0)
 
     # Zaznamenání startu skriptu
     log_message(f"🚀 === START {os.path.basename(__file__)} - {LOG_FILE} ===")
@@ -14,14 +14,37 @@ a zároveň vypisoval zprávy do terminálu.
 
 2. **Třída `DualLogger`**:
     - Tato třída přesměrovává výstup jak do terminálu, tak do logovacího souboru.
-    - Metoda `write` zajišťuje, že všechny zprávy jsou zapsány do obou výstupů.
+    - Metoda `write` zajišťuje, že všechny zprávy jsou zapsány do obou výstupů. Do logu zapisuje
+      celé řádky a oba výstupy vyprazdňuje jen jednou za řádek, nebo po překročení času či velikosti.
     - Metoda `flush` zajišťuje, že všechny výstupy jsou správně vyprázdněny.
+    - Je to plnohodnotný textový proud (`io.TextIOBase`), lze ho použít v bloku `with`,
+      který na konci zavře logovací soubor.
 
 3. **Metatřída `MetaLogger`**:
     - Tato metatřída automaticky obaluje všechny metody tříd, které ji používají, logovací funkcionalitou.
-    - Metoda `__new__` přidává logování ke všem metodám nové třídy.
-    - Metoda `_log_method` obaluje jednotlivé metody logováním.
+    - Metoda `__new__` přidává logování k metodám nové třídy vybraným pravidly z modulu
+      `log_instrumentation` (vzory `LOG_INCLUDE`/`LOG_EXCLUDE`, atributy třídy `__log_include__`
+      a `__log_exclude__`, dekorátory `@log_always` a `@no_log`). Soukromé a dunder metody se
+      ve výchozím stavu neobalují, správně se obalují i `staticmethod`, `classmethod` a `property`.
+    - Metoda `_log_method` obaluje jednotlivé metody logováním. Argumenty se předávají jako parametry
+      záznamu a `repr()` se volá až při jeho skutečném zápisu, zkrácené podle `ARG_REPR`.
+    - Metoda `set_sampling` nastaví za běhu vzorkování (každé n-té volání, limit záznamů za sekundu)
+      pro celou třídu nebo jednu metodu. Nezalogovaná volání se souhrnně vypíší jednou za
+      `SAMPLING_SUMMARY_INTERVAL` sekund a při ukončení programu.
+    - Metody `enable_profiling` a `disable_profiling` zapínají měření doby volání metod
+      (reálný i procesorový čas, histogramy p50/p95/p99/max). Výsledky vrací `profile_report`
+      a `export_profile` je uloží do JSON.
+    - Metoda `enable_structured_log` přepne záznamy volání do strukturovaného formátu JSON Lines
+      (`log/method_calls_2.jsonl`: třída, metoda, id objektu, čas v ns, doba trvání, vlákno).
+      Soubor rychle prohledává skript `log_query.py`.
+    - Volání přes `super()` v hierarchii tříd (stejná metoda téhož objektu) se loguje jen jednou,
+      na nejvyšší úrovni. Metoda `enable_spans` přidá ke každému záznamu číslo volání (span)
+      a číslo volání, ze kterého bylo zavoláno (rodič), z logu lze tak sestavit strom volání.
+    - Třída `LogCollector` spustí sběrný proces, který jako jediný zapisuje do logu. Pracovní
+      procesy mu po zavolání `connect_to_collector(queue)` posílají hotové řádky frontou,
+      takže se řádky z různých procesů neprolínají ani netrhají.
     - Metody `enable_logging` a `disable_logging` umožňují zapnutí a vypnutí logování.
+      Při vypnutí se ve třídách obalené metody vymění za původní funkce, vypnuté logování tak nemá žádnou režii.
 
 4. **Třídy `Auto` a `Letadlo`**:
     - Tyto třídy využívají metatřídu `MetaLogger` pro automatické logování volání jejich metod.
@@ -43,62 +66,568 @@ Tento skript je užitečný pro studenty, kteří se chtějí naučit, jak použ
 a jak implementovat logování volání metod automaticky.
 """
 
+import atexit
+import contextlib
 import functools
+import io
+import itertools
+import json
 import logging
+import multiprocessing
+import multiprocessing.util
+import queue
+import signal
 import sys
 import os
+import threading
+import time
+import reprlib
+import weakref
 from datetime import datetime
 
+from log_instrumentation import class_patterns, instrument_attribute, log_always, mark_wrapper, should_instrument
+from log_rotation import RotatingLogFile, RotatingLogHandler
+
 # Logování - povolení/vypnutí logování
 LOG_ENABLED = True  # Přepínač pro zapnutí/vypnutí logování před startem skriptu
+PROFILING_ENABLED = False  # Měření doby volání metod, zapíná MetaLogger.enable_profiling()
+SPANS_ENABLED = False  # Záznam vnoření volání (span a rodič), zapíná MetaLogger.enable_spans()
+
+# Výchozí výběr metod k logování (vzory fnmatch), třída je může změnit atributy
+# __log_include__ a __log_exclude__, jednotlivé metody dekorátory @log_always a @no_log
+LOG_INCLUDE = ("*",)
+LOG_EXCLUDE = ("_*",)  # Soukromé metody a dunder metody se neobalují
 
 # Nastavení relativní cesty k logu
 LOG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "log")  # Relativní cesta k adresáři /log
 LOG_FILE = os.path.join(LOG_DIR, "method_calls_2.log")  # Plná cesta k logovacímu souboru
+EVENTS_FILE = os.path.join(LOG_DIR, "method_calls_2.jsonl")  # Strukturované záznamy volání (JSON Lines)
 
 # Pokud složka log neexistuje, vytvoříme ji
 if not os.path.exists(LOG_DIR):
     os.makedirs(LOG_DIR)
 
+# Rotace logu, starší segmenty čte funkce log_rotation.iter_log_lines(LOG_FILE)
+LOG_MAX_BYTES = 10 * 1024 * 1024  # Rotace po dosažení velikosti souboru
+LOG_ROTATE_INTERVAL = 24 * 3600   # Rotace nejpozději po tolika sekundách
+LOG_BACKUP_COUNT = 30             # Počet ponechaných rotovaných segmentů
+LOG_COMPRESSION = "gzip"          # Komprese segmentů: "gzip", "bz2", "lzma" nebo None
+
+# Společný logovací soubor pro logging i DualLogger, aby se rotoval jen jednou
+LOG_STORAGE = RotatingLogFile(LOG_FILE, max_bytes=LOG_MAX_BYTES, rotate_interval=LOG_ROTATE_INTERVAL,
+                              backup_count=LOG_BACKUP_COUNT, compression=LOG_COMPRESSION)
+
+# Soubor strukturovaných záznamů volání, None = záznamy volání jdou do textového logu
+EVENT_LOG = None
+
 # Správné nastavení logování (vždy UTF-8, timestamp, formát zpráv)
 logging.basicConfig(
-    filename=LOG_FILE,
+    handlers=[RotatingLogHandler(LOG_STORAGE)],
     level=logging.INFO,
     format="%(asctime)s - %(levelname)s - %(message)s",
     datefmt="%Y-%m-%d %H:%M:%S",
-    encoding="utf-8"
 )
 
+# Logger pro záznamy volání metod (kořenový, stejný jako u logging.info)
+call_logger = logging.getLogger()
+
+# Omezení délky argumentů v záznamech volání, hodnoty lze měnit za běhu
+ARG_REPR = reprlib.Repr()
+ARG_REPR.maxlevel = 3     # Hloubka vnořených struktur
+ARG_REPR.maxlist = 10     # Počet vypsaných prvků seznamů, n-tic, množin a slovníků
+ARG_REPR.maxdict = 10
+ARG_REPR.maxstring = 120  # Délka řetězců
+ARG_REPR.maxother = 120   # Délka repr() ostatních objektů
+
+
+class LazyRepr:
+    """Odloží `repr()` argumentu až na dobu, kdy se záznam skutečně formátuje.
+
+    Pokud je záznam odfiltrován, repr se nevolá vůbec.
+    """
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __str__(self):
+        return ARG_REPR.repr(self.value)
+
 
 
 # Třída pro správné přesměrování výstupu do logu i terminálu, pomocná třída
 # Může být vynechána, pokud chcete pouze logovat do souboru bez terminálových stringů
-class DualLogger:
+class DualLogger(io.TextIOBase):
     """Třída DualLogger zachytává výstup a posílá ho do logu i do terminálu.
     Bez této třídy by se výstup z terminálu nezobrazil v logu.
+
+    Zápisy se skládají po řádcích: do logu jde každý celý neprázdný řádek s časovým
+    razítkem (formátovaným jen jednou za sekundu). Při `line_buffering=True` se oba
+    výstupy vyprázdní jednou za zápis obsahující konec řádku, jinak až po
+    `flush_interval` sekundách nebo `buffer_size` znacích.
     Atributy:
         terminal (TextIO): Původní terminálový výstupní proud.
-        log (TextIO): Výstupní proud logovacího souboru.
+        log (TextIO): Výstupní proud logovacího souboru. Výchozí je sdílený LOG_STORAGE
+            (hledá se při každém zápisu, po LogCollector.start() tedy jde výstup do sběrného
+            procesu), soubor zadaný cestou DualLogger sám otevře a v close() zavře.
     Metody:
         Zapíše zprávu jak do terminálu, tak do logovacího souboru.
         Přeskakuje prázdné řádky, pokud je logování povoleno.
         Vyprázdní oba výstupní proudy, terminál i logovací soubor.
     """
-    
-    def __init__(self, original_stdout): 
-        self.terminal = original_stdout                   # Původní terminálový výstup
-        self.log = open(LOG_FILE, "a", encoding="utf-8")  # Správné kódování
 
-    def write(self, message): 
+    def __init__(self, original_stdout, log_file=None, line_buffering=True, flush_interval=1.0, buffer_size=65536):
+        super().__init__()
+        self.terminal = original_stdout  # Původní terminálový výstup
+        self._owns_log = isinstance(log_file, str)
+        if self._owns_log:
+            self._log = open(log_file, "a", encoding="utf-8")  # Správné kódování
+        else:
+            self._log = log_file  # None = aktuální LOG_STORAGE
+        self.line_buffering = line_buffering
+        self.flush_interval = flush_interval
+        self.buffer_size = buffer_size
+        self._partial_line = ""  # Rozepsaný řádek, do logu půjde až s koncem řádku
+        self._unflushed = 0      # Počet znaků zapsaných od posledního vyprázdnění
+        self._last_flush = time.monotonic()
+        self._timestamp_second = None
+        self._timestamp = ""
+
+    def write(self, message):
+        if self.closed:
+            raise ValueError("I/O operation on closed file.")
         self.terminal.write(message)  # Výpis do terminálu
-        self.terminal.flush()
-        if LOG_ENABLED and message.strip():  # Přeskakujeme prázdné řádky, pokud je logování povoleno
-            self.log.write(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} - TERMINÁL - {message}\n")
-            self.log.flush()
+        self._unflushed += len(message)
+        if "\n" in message:
+            lines = (self._partial_line + message).split("\n")
+            self._partial_line = lines.pop()
+            self._write_log_lines(lines)
+            if self.line_buffering:
+                self.flush()
+                return len(message)
+        else:
+            self._partial_line += message
+            if len(self._partial_line) >= self.buffer_size:
+                self._write_log_lines([self._partial_line])
+                self._partial_line = ""
+        if self._unflushed >= self.buffer_size or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+        return len(message)
+
+    @property
+    def log(self):
+        return self._log if self._log is not None else LOG_STORAGE
+
+    def _write_log_lines(self, lines):
+        if not LOG_ENABLED:
+            return
+        second = int(time.time())
+        if second != self._timestamp_second:
+            self._timestamp_second = second
+            self._timestamp = datetime.fromtimestamp(second).strftime('%Y-%m-%d %H:%M:%S')
+        prefix = f"{self._timestamp} - TERMINÁL - "
+        # Přeskakujeme prázdné řádky
+        self.log.write("".join(f"{prefix}{line}\n" for line in lines if line.strip()))
+
+    def writelines(self, lines):
+        self.write("".join(lines))
 
     def flush(self):
+        if self.closed:
+            raise ValueError("I/O operation on closed file.")
         self.terminal.flush()
         self.log.flush()
+        self._unflushed = 0
+        self._last_flush = time.monotonic()
+
+    def close(self):
+        """Zapíše rozepsaný řádek, vyprázdní oba výstupy a zavře logovací soubor (terminál ne)."""
+        if self.closed:
+            return
+        if self._partial_line:
+            self._write_log_lines([self._partial_line])
+            self._partial_line = ""
+        try:
+            super().close()  # Volá flush()
+        finally:
+            if self._owns_log:
+                self.log.close()
+
+    def writable(self):
+        return True
+
+    def isatty(self):
+        return self.terminal.isatty()
+
+    def fileno(self):
+        return self.terminal.fileno()
+
+    @property
+    def encoding(self):
+        return self.terminal.encoding
+
+    @property
+    def errors(self):
+        return self.terminal.errors
+
+
+class CollectorStream:
+    """Proud pro pracovní proces, který posílá řádky logu sběrnému procesu.
+
+    Řádky se sbírají a posílají frontou po dávkách (nejvýše `batch_size` řádků
+    nebo po `flush_interval` sekundách). Pořadí řádků jednoho procesu zůstává zachováno.
+    Dávku po `flush_interval` odešle vlákno na pozadí, i když už proces nic nezapisuje.
+    """
+
+    def __init__(self, log_queue, batch_size=500, flush_interval=0.2):
+        self.queue = log_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._lines = []
+        self._first_line_time = 0.0
+        # RLock: flush() volá i obsluha SIGTERM, která může přerušit write() téhož vlákna
+        self._lock = threading.RLock()
+        self._closed = threading.Event()
+        self._timer = None
+
+    def write(self, text):
+        with self._lock:
+            if not self._lines:
+                self._first_line_time = time.monotonic()
+            self._lines.append(text)
+            if len(self._lines) >= self.batch_size or time.monotonic() - self._first_line_time >= self.flush_interval:
+                self._send()
+            if self._timer is None:
+                self._timer = threading.Thread(target=self._run_timer, name="CollectorStream", daemon=True)
+                self._timer.start()
+        return len(text)
+
+    def flush(self):
+        with self._lock:
+            self._send()
+
+    def close(self):
+        """Zastaví vlákno na pozadí a odešle zbylé řádky."""
+        self._closed.set()
+        if self._timer is not None and self._timer is not threading.current_thread():
+            self._timer.join()
+        self.flush()
+
+    def _run_timer(self):
+        while not self._closed.wait(self.flush_interval):
+            self.flush()
+
+    def _send(self):
+        if self._lines:
+            self.queue.put("".join(self._lines))
+            self._lines = []
+
+
+class _CollectorHandler(logging.Handler):
+    """Handler modulu logging, který předává naformátované záznamy do CollectorStream."""
+
+    def __init__(self, stream):
+        super().__init__()
+        self.stream = stream
+
+    def emit(self, record):
+        try:
+            self.stream.write(self.format(record) + "\n")
+        except Exception:
+            self.handleError(record)
+
+
+def _exit_on_sigterm(signum, frame):
+    # Ukončí proces přes SystemExit, aby proběhly finalizery multiprocessing a odeslaly řádky
+    raise SystemExit(128 + signum)
+
+
+def connect_to_collector(log_queue):
+    """Přesměruje logování tohoto procesu do fronty sběrného procesu.
+
+    Volá se v každém pracovním procesu, např. jako initializer v multiprocessing.Pool.
+    Nezapsané řádky se odešlou při ukončení procesu, v pracovním procesu na POSIXu
+    i po SIGTERM (Pool.terminate(), konec bloku `with Pool(...)`).
+    """
+    global LOG_STORAGE
+    # Předchozí LOG_STORAGE se nevyprázdní: po fork obsahuje nezapsané řádky rodiče,
+    # které rodič zapíše sám, tady by se zapsaly podruhé
+    stream = CollectorStream(log_queue)
+    root_logger = logging.getLogger()
+    handler = _CollectorHandler(stream)
+    handler.setFormatter(root_logger.handlers[0].formatter if root_logger.handlers else None)
+    for old_handler in root_logger.handlers[:]:
+        root_logger.removeHandler(old_handler)
+    root_logger.addHandler(handler)
+    LOG_STORAGE = stream
+    if (os.name == "posix" and multiprocessing.parent_process() is not None
+            and signal.getsignal(signal.SIGTERM) == signal.SIG_DFL):
+        signal.signal(signal.SIGTERM, _exit_on_sigterm)
+    # Finalize proběhne i v procesech multiprocessing, které atexit nevolají
+    multiprocessing.util.Finalize(None, _disconnect_from_collector, args=(stream,), exitpriority=100)
+
+
+def _disconnect_from_collector(stream):
+    # SIGTERM během ukončování už proces neukončí, jinak by přerušil odesílání řádků
+    if signal.getsignal(signal.SIGTERM) is _exit_on_sigterm:
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    stream.close()
+
+
+def _run_log_collector(log_queue, log_file):
+    """Hlavní smyčka sběrného procesu: jako jediný zapisuje řádky z fronty do logu."""
+    with RotatingLogFile(log_file, max_bytes=LOG_MAX_BYTES, rotate_interval=LOG_ROTATE_INTERVAL,
+                         backup_count=LOG_BACKUP_COUNT, compression=LOG_COMPRESSION) as storage:
+        while True:
+            chunks = [log_queue.get()]
+            while chunks[-1] is not None and len(chunks) < 1000:
+                try:
+                    chunks.append(log_queue.get_nowait())
+                except queue.Empty:
+                    break
+            storage.write("".join(chunk for chunk in chunks if chunk is not None))
+            storage.flush()
+            if chunks[-1] is None:
+                break
+        RotatingLogFile.wait_for_compression()
+
+
+class LogCollector:
+    """Sběrný proces pro logování z více procesů.
+
+    Po start() zapisuje do logu jen sběrný proces, aktuální proces i pracovní procesy
+    (po connect_to_collector(collector.queue)) mu posílají řádky frontou.
+    stop() počká na zápis všech řádků a vrátí aktuální proces k přímému zápisu.
+    """
+
+    def __init__(self, log_file=LOG_FILE):
+        self.log_file = log_file
+        self.queue = multiprocessing.Queue()
+        self._process = None
+        self._saved_state = None
+
+    def start(self):
+        root_logger = logging.getLogger()
+        self._saved_state = (LOG_STORAGE, root_logger.handlers[:])
+        LOG_STORAGE.flush()
+        self._process = multiprocessing.Process(target=_run_log_collector, args=(self.queue, self.log_file),
+                                                name="LogCollector", daemon=True)
+        self._process.start()
+        connect_to_collector(self.queue)
+        return self
+
+    def stop(self):
+        global LOG_STORAGE
+        LOG_STORAGE.close()
+        self.queue.put(None)
+        self._process.join()
+        # Vrátíme přímý zápis do souboru, který mezitím mohl sběrný proces rotovat
+        LOG_STORAGE, handlers = self._saved_state
+        LOG_STORAGE.reopen()
+        root_logger = logging.getLogger()
+        for handler in root_logger.handlers[:]:
+            root_logger.removeHandler(handler)
+        for handler in handlers:
+            root_logger.addHandler(handler)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+class _CallFrame:
+    """Rozpracované volání metody obalené logováním."""
+
+    __slots__ = ("receiver", "class_name", "method_name", "span")
+
+    def __init__(self, receiver, class_name, method_name):
+        self.receiver = receiver
+        self.class_name = class_name
+        self.method_name = method_name
+        self.span = None
+
+
+class _ActiveCalls(threading.local):
+    """Zásobník rozpracovaných volání, každé vlákno má vlastní."""
+
+    def __init__(self):
+        self.frames = []
+
+
+_active_calls = _ActiveCalls()
+_span_ids = itertools.count(1)
+
+
+def _parent_span(frames):
+    """Vrátí span nejbližšího zalogovaného volání, ze kterého bylo volání zavoláno."""
+    for frame in reversed(frames):
+        if frame.span is not None:
+            return frame.span
+    return None
+
+
+def _write_event(class_name, method_name, args, duration_ns, error, span=None, parent=None):
+    """Zapíše jeden strukturovaný záznam volání do EVENT_LOG.
+
+    Klíč "ts" (čas zápisu záznamu v ns) je vždy první. Čte se pod zámkem souboru
+    (RotatingLogFile.write_stamped), soubor je podle něj seřazený i při zápisu
+    z více vláken a log_query.py v něm může hledat půlením intervalu.
+    """
+    event = {
+        "class": class_name,
+        "method": method_name,
+        "object": id(args[0]) if args else None,
+        "thread": threading.get_ident(),
+        "duration_ns": duration_ns,
+        "exception": type(error).__name__ if error is not None else None,
+    }
+    if span is not None:
+        event["span"] = span
+        event["parent"] = parent
+    # JSON bez času se připraví mimo zámek, pod zámkem se jen doplní "ts" na začátek
+    body = json.dumps(event, separators=(",", ":"))[1:]
+    EVENT_LOG.write_stamped(lambda ts: f'{{"ts":{ts},{body}\n')
+
+
+def _call_with_event(class_name, method_name, method, args, kwargs, span=None, parent=None):
+    """Zavolá metodu, změří dobu jejího trvání a zapíše strukturovaný záznam."""
+    error = None
+    start = time.perf_counter_ns()
+    try:
+        return method(*args, **kwargs)
+    except BaseException as call_error:
+        error = call_error
+        raise
+    finally:
+        _write_event(class_name, method_name, args, time.perf_counter_ns() - start, error, span, parent)
+
+
+# Jak často (v sekundách) se zapisuje souhrn vzorkovaných volání
+SAMPLING_SUMMARY_INTERVAL = 60.0
+
+
+class SamplingPolicy:
+    """Rozhoduje, která volání metody se zalogují.
+
+    Atributy:
+        every_nth (int): Loguje se jen každé n-té volání (1 = všechna).
+        rate_limit (float | None): Nejvýše tolik záznamů za sekundu (token bucket),
+            limit sdílejí všechny metody se stejnou politikou. None = bez omezení.
+        burst (float): Kolik záznamů lze zapsat najednou, než se limit projeví.
+        log_exceptions (bool): Volání, které skončí výjimkou, se zaloguje vždy.
+    """
+
+    def __init__(self, every_nth=1, rate_limit=None, burst=None, log_exceptions=True):
+        self.every_nth = every_nth
+        self.rate_limit = rate_limit
+        self.burst = burst if burst is not None else max(1.0, rate_limit or 1.0)
+        self.log_exceptions = log_exceptions
+        self._tokens = self.burst
+        self._last_refill = time.monotonic()
+
+    def should_log(self, call_number):
+        """Vrátí True, pokud se má zalogovat volání s daným pořadovým číslem (od 1)."""
+        if (call_number - 1) % self.every_nth:
+            return False
+        if self.rate_limit is None:
+            return True
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate_limit)
+        self._last_refill = now
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+
+class _CallStats:
+    """Počty volání a zalogovaných volání jedné metody od posledního souhrnu (přibližné, bez zámku)."""
+    __slots__ = ("calls", "logged", "total_calls")
+
+    def __init__(self):
+        self.calls = 0
+        self.logged = 0
+        self.total_calls = 0
+
+
+class LatencyHistogram:
+    """Streamovaný histogram dob volání v nanosekundách.
+
+    Koše jsou logaritmické s 32 podkoši na každou mocninu dvou, kvantily mají
+    relativní chybu nejvýše ~3 % a paměť nezávisí na počtu volání.
+    """
+    __slots__ = ("buckets", "count", "total", "max")
+
+    def __init__(self):
+        self.buckets = {}  # {index koše: počet hodnot}
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, value):
+        """Přidá jednu naměřenou hodnotu."""
+        if value < 64:
+            index = max(value, 0)
+        else:
+            shift = value.bit_length() - 6
+            index = (shift << 5) + (value >> shift)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, fraction):
+        """Vrátí přibližnou hodnotu kvantilu (např. 0.99 pro p99)."""
+        if not self.count:
+            return 0
+        rank = max(1, round(fraction * self.count))
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                if index < 64:
+                    return index
+                shift = (index >> 5) - 1
+                lower = (index - (shift << 5)) << shift
+                return min(lower + (1 << shift) // 2, self.max)
+        return self.max
+
+    def summary(self):
+        """Vrátí souhrn histogramu jako slovník (hodnoty v ns)."""
+        return {
+            "count": self.count,
+            "total_ns": self.total,
+            "mean_ns": self.total // self.count if self.count else 0,
+            "p50_ns": self.percentile(0.50),
+            "p95_ns": self.percentile(0.95),
+            "p99_ns": self.percentile(0.99),
+            "max_ns": self.max,
+        }
+
+
+class _MethodProfile:
+    """Naměřené doby volání jedné metody (přibližné při souběžných voláních, bez zámku)."""
+    __slots__ = ("wall", "cpu")
+
+    def __init__(self):
+        self.wall = LatencyHistogram()  # Reálný čas (perf_counter_ns)
+        self.cpu = LatencyHistogram()   # Procesorový čas vlákna (thread_time_ns)
+
+
+class _ProfilingOverhead(threading.local):
+    """Režie měření a logování vnořených volání, odečítá se od doby volajících metod."""
+
+    def __init__(self):
+        self.wall = 0       # Celková režie dokončených měřených volání (ns)
+        self.cpu = 0
+        self.last_wall = 0  # Hrubá doba posledního dokončeného volání samotné metody
+        self.last_cpu = 0
+
+
+_profiling_overhead = _ProfilingOverhead()
 
 
 # Metatřída, která automaticky loguje volání metod potomka do souboru.
@@ -108,39 +637,199 @@ class MetaLogger(type):
     Metatřída MetaLogger automaticky loguje volání metod do souboru.
     Metody:
         __new__(cls, name, bases, dct):
-            Přidá logování ke všem metodám nové třídy.
-        _log_method(cls, method_name, method):
+            Přidá logování k metodám nové třídy vybraným pravidly (viz log_instrumentation).
+        _log_method(cls, class_name, method_name, method):
             Obalí metodu logováním, pokud je logování povoleno.
+        set_sampling(cls, policy, class_name=None, method_name=None):
+            Nastaví politiku vzorkování pro všechny třídy, jednu třídu nebo jednu metodu.
+        log_sampling_summary(cls):
+            Zapíše souhrn volání, která kvůli vzorkování nebyla zalogována.
+        enable_profiling(cls), disable_profiling(cls):
+            Zapne/vypne měření doby volání metod.
+        profile_report(cls), export_profile(cls, file_path), reset_profile(cls):
+            Vrátí textový přehled měření, uloží ho do JSON, nebo ho vynuluje.
+        enable_structured_log(cls, file_path=EVENTS_FILE), disable_structured_log(cls):
+            Přepne záznamy volání do souboru JSON Lines, nebo zpět do textového logu.
+        enable_spans(cls), disable_spans(cls):
+            Zapne/vypne číslování volání (span a rodič) pro sestavení stromu volání.
         enable_logging(cls):
             Zapne logování.
         disable_logging(cls):
             Vypne logování.
+        _install_wrappers(cls, enabled):
+            Vymění ve všech třídách obalené metody za původní, nebo naopak.
     """
- 
+
+    # Původní a obalené metody všech tříd vytvořených metatřídou:
+    # {třída: {název: (původní, s logováním, s měřením času)}}
+    _wrapped_methods = weakref.WeakKeyDictionary()
+
+    # Politiky vzorkování: {(třída, metoda): politika}, None znamená libovolnou třídu/metodu
+    _sampling_policies = {(None, None): SamplingPolicy()}
+    # Statistiky volání: {(třída, metoda): _CallStats}
+    _call_stats = {}
+    _next_summary = time.monotonic() + SAMPLING_SUMMARY_INTERVAL
+    # Měření dob volání: {(třída, metoda): _MethodProfile}
+    _profiles = {}
+
     def __new__(cls, name, bases, dct):
-        """Přidá logování ke všem metodám nové třídy."""
+        """Přidá logování k metodám nové třídy vybraným pravidly."""
+        include = class_patterns(dct, bases, "__log_include__", LOG_INCLUDE)
+        exclude = class_patterns(dct, bases, "__log_exclude__", LOG_EXCLUDE)
+
+        def wrap(method, method_name):
+            logging_wrapper = cls._log_method(name, method_name, method)
+            return logging_wrapper, cls._profile_method(name, method_name, method)
+
+        wrapped_methods = {}
         for attr_name, attr_value in dct.items():
-            if callable(attr_value):  # Pokud je atribut metoda, obalíme ji logováním
-                dct[attr_name] = cls._log_method(attr_name, attr_value)
-        return super().__new__(cls, name, bases, dct)
+            if should_instrument(attr_name, attr_value, include, exclude):
+                wrapped_methods[attr_name] = (attr_value, *instrument_attribute(attr_name, attr_value, wrap))
+        for attr_name, variants in wrapped_methods.items():
+            dct[attr_name] = cls._active_variant(*variants)
+        new_class = super().__new__(cls, name, bases, dct)
+        MetaLogger._wrapped_methods[new_class] = wrapped_methods
+        return new_class
 
     @classmethod
-    def _log_method(cls, method_name, method):
+    def _log_method(cls, class_name, method_name, method):
         """Obalí metodu logováním, pokud je logování povoleno."""
+        stats = MetaLogger._call_stats.setdefault((class_name, method_name), _CallStats())
+        policies = MetaLogger._sampling_policies
+
         @functools.wraps(method)
         def wrapper(*args, **kwargs):
-            global LOG_ENABLED
-            if LOG_ENABLED:
-                log_msg = f"📢 Volání metody: {method_name}, Argumenty: {args}, {kwargs}"
-                logging.info(log_msg)
-            return method(*args, **kwargs)
-        return wrapper
+            if not (LOG_ENABLED and call_logger.isEnabledFor(logging.INFO)):
+                return method(*args, **kwargs)
+            frames = _active_calls.frames
+            receiver = args[0] if args else None
+            if frames:
+                caller = frames[-1]
+                # Volání stejné metody téhož objektu z přepsané metody potomka (super()) je
+                # pokračování už zalogovaného volání, nelogujeme ho znovu
+                if caller.receiver is receiver and caller.method_name == method_name and caller.class_name != class_name:
+                    return method(*args, **kwargs)
+            frame = _CallFrame(receiver, class_name, method_name)
+            frames.append(frame)
+            try:
+                policy = (policies.get((class_name, method_name)) or policies.get((class_name, None))
+                          or policies.get((None, method_name)) or policies[(None, None)])
+                stats.calls += 1
+                stats.total_calls += 1
+                logged = policy.should_log(stats.total_calls)
+                if time.monotonic() >= MetaLogger._next_summary:
+                    MetaLogger.log_sampling_summary()
+                if logged:
+                    stats.logged += 1
+                    parent = None
+                    if SPANS_ENABLED:
+                        parent = _parent_span(frames)
+                        frame.span = next(_span_ids)
+                    if EVENT_LOG is not None:
+                        return _call_with_event(class_name, method_name, method, args, kwargs, frame.span, parent)
+                    if frame.span is not None:
+                        call_logger.info("📢 Volání metody: %s, Argumenty: %s, %s [span %s, rodič %s]",
+                                         method_name, LazyRepr(args), LazyRepr(kwargs), frame.span, parent)
+                    else:
+                        call_logger.info("📢 Volání metody: %s, Argumenty: %s, %s", method_name, LazyRepr(args), LazyRepr(kwargs))
+                if logged or not policy.log_exceptions:
+                    return method(*args, **kwargs)
+                try:
+                    return method(*args, **kwargs)
+                except Exception as error:
+                    stats.logged += 1
+                    if EVENT_LOG is not None:
+                        _write_event(class_name, method_name, args, None, error)
+                    else:
+                        call_logger.info("📢 Volání metody: %s skončilo výjimkou %r, Argumenty: %s, %s",
+                                         method_name, error, LazyRepr(args), LazyRepr(kwargs))
+                    raise
+            finally:
+                frames.pop()
+        return mark_wrapper(wrapper)
+
+    @classmethod
+    def _profile_method(cls, class_name, method_name, method):
+        """Obalí metodu měřením reálného a procesorového času volání a logováním.
+
+        Měří se jen samotná metoda: logování je vně měřeného úseku a od doby metody se
+        odečte režie měření a logování metod, které z ní byly zavolány. Zbývá jen čtení
+        hodin (jednotky µs na každé vnořené měřené volání).
+        """
+        profile = MetaLogger._profiles.setdefault((class_name, method_name), _MethodProfile())
+        overhead = _profiling_overhead
+
+        @functools.wraps(method)
+        def timed(*args, **kwargs):
+            nested_wall, nested_cpu = overhead.wall, overhead.cpu
+            # Pomalejší thread_time_ns je vně úseku měřeného perf_counter_ns
+            cpu_start = time.thread_time_ns()
+            wall_start = time.perf_counter_ns()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                wall = time.perf_counter_ns() - wall_start
+                cpu = time.thread_time_ns() - cpu_start
+                overhead.last_wall, overhead.last_cpu = wall, cpu
+                profile.cpu.record(cpu - (overhead.cpu - nested_cpu))
+                profile.wall.record(wall - (overhead.wall - nested_wall))
+
+        logging_wrapper = cls._log_method(class_name, method_name, timed)
+
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            wall_start = time.perf_counter_ns()
+            cpu_start = time.thread_time_ns()
+            overhead.last_wall = overhead.last_cpu = 0
+            try:
+                return logging_wrapper(*args, **kwargs)
+            finally:
+                # Režie tohoto volání = celá doba bez samotné metody
+                overhead.cpu += time.thread_time_ns() - cpu_start - overhead.last_cpu
+                overhead.wall += time.perf_counter_ns() - wall_start - overhead.last_wall
+        return mark_wrapper(wrapper)
+
+    @staticmethod
+    def _active_variant(method, logging_wrapper, profiling_wrapper):
+        """Vybere variantu metody podle toho, zda je zapnuté měření a logování."""
+        if PROFILING_ENABLED:
+            return profiling_wrapper
+        if LOG_ENABLED:
+            return logging_wrapper
+        return method
+
+    @classmethod
+    def set_sampling(cls, policy, class_name=None, method_name=None):
+        """Nastaví politiku vzorkování; policy=None nastavení odstraní.
+
+        Přednost má nastavení pro konkrétní metodu třídy, pak pro třídu, pak pro název
+        metody v libovolné třídě a nakonec výchozí politika (class_name=method_name=None).
+        """
+        key = (class_name, method_name)
+        if policy is not None:
+            MetaLogger._sampling_policies[key] = policy
+        elif key != (None, None):
+            MetaLogger._sampling_policies.pop(key, None)
+        else:
+            MetaLogger._sampling_policies[key] = SamplingPolicy()
+
+    @classmethod
+    def log_sampling_summary(cls):
+        """Zapíše souhrn metod, jejichž volání nebyla kvůli vzorkování všechna zalogována."""
+        MetaLogger._next_summary = time.monotonic() + SAMPLING_SUMMARY_INTERVAL
+        for (class_name, method_name), stats in list(MetaLogger._call_stats.items()):
+            calls, logged = stats.calls, stats.logged
+            stats.calls = stats.logged = 0
+            if calls > logged:
+                call_logger.info("📊 %s.%s voláno %s×, zalogováno %s×",
+                                 class_name, method_name, f"{calls:,}".replace(",", " "), f"{logged:,}".replace(",", " "))
 
     @classmethod
     def enable_logging(cls):
         """Zapne logování."""
         global LOG_ENABLED
         LOG_ENABLED = True
+        cls._install_wrappers()
         logging.info(f"📢 ZAPNUTO LOGOVÁNÍ")
 
     @classmethod
@@ -149,6 +838,101 @@ class MetaLogger(type):
         global LOG_ENABLED
         logging.info(f"📢 VYPNUTO LOGOVÁNÍ")
         LOG_ENABLED = False
+        cls._install_wrappers()
+
+    @classmethod
+    def enable_structured_log(cls, file_path=EVENTS_FILE):
+        """Zapisuje záznamy volání metod jako JSON Lines místo textového logu."""
+        global EVENT_LOG
+        cls.disable_structured_log()
+        EVENT_LOG = RotatingLogFile(file_path, max_bytes=LOG_MAX_BYTES, rotate_interval=LOG_ROTATE_INTERVAL,
+                                    backup_count=LOG_BACKUP_COUNT, compression=LOG_COMPRESSION)
+        atexit.register(EVENT_LOG.close)
+
+    @classmethod
+    def disable_structured_log(cls):
+        """Vrátí záznamy volání metod zpět do textového logu."""
+        global EVENT_LOG
+        if EVENT_LOG is not None:
+            event_log, EVENT_LOG = EVENT_LOG, None
+            atexit.unregister(event_log.close)
+            event_log.close()
+
+    @classmethod
+    def enable_spans(cls):
+        """Přidá k záznamům volání číslo volání (span) a číslo volajícího volání (rodič)."""
+        global SPANS_ENABLED
+        SPANS_ENABLED = True
+
+    @classmethod
+    def disable_spans(cls):
+        """Vypne číslování volání."""
+        global SPANS_ENABLED
+        SPANS_ENABLED = False
+
+    @classmethod
+    def enable_profiling(cls):
+        """Zapne měření doby volání metod."""
+        global PROFILING_ENABLED
+        PROFILING_ENABLED = True
+        cls._install_wrappers()
+
+    @classmethod
+    def disable_profiling(cls):
+        """Vypne měření doby volání metod, naměřené hodnoty zůstanou zachovány."""
+        global PROFILING_ENABLED
+        PROFILING_ENABLED = False
+        cls._install_wrappers()
+
+    @classmethod
+    def reset_profile(cls):
+        """Vynuluje všechna dosavadní měření."""
+        for profile in MetaLogger._profiles.values():
+            profile.wall = LatencyHistogram()
+            profile.cpu = LatencyHistogram()
+
+    @classmethod
+    def profile_data(cls):
+        """Vrátí naměřené hodnoty metod, které byly volány: {"Třída.metoda": {"wall": ..., "cpu": ...}}."""
+        return {
+            f"{class_name}.{method_name}": {"wall": profile.wall.summary(), "cpu": profile.cpu.summary()}
+            for (class_name, method_name), profile in MetaLogger._profiles.items()
+            if profile.wall.count
+        }
+
+    @classmethod
+    def profile_report(cls):
+        """Vrátí textový přehled měření seřazený podle celkového reálného času."""
+        rows = sorted(cls.profile_data().items(), key=lambda item: item[1]["wall"]["total_ns"], reverse=True)
+        lines = [f"{'Metoda':<30} {'Volání':>9} {'Celkem ms':>10} {'p50 µs':>9} {'p95 µs':>9} {'p99 µs':>9} {'max µs':>9} {'CPU ms':>9}"]
+        for method_label, data in rows:
+            wall = data["wall"]
+            lines.append(
+                f"{method_label:<30} {wall['count']:>9} {wall['total_ns'] / 1e6:>10.3f} {wall['p50_ns'] / 1e3:>9.1f} "
+                f"{wall['p95_ns'] / 1e3:>9.1f} {wall['p99_ns'] / 1e3:>9.1f} {wall['max_ns'] / 1e3:>9.1f} "
+                f"{data['cpu']['total_ns'] / 1e6:>9.3f}"
+            )
+        return "\n".join(lines)
+
+    @classmethod
+    def export_profile(cls, file_path):
+        """Uloží naměřené hodnoty do JSON souboru."""
+        with open(file_path, "w", encoding="utf-8") as json_file:
+            json.dump(cls.profile_data(), json_file, ensure_ascii=False, indent=4)
+
+    @classmethod
+    def _install_wrappers(cls):
+        """Vloží do všech tříd variantu metod odpovídající zapnutému logování a měření.
+
+        Vypnuté logování i měření tak nepřidává k volání metod žádnou režii.
+        """
+        for logged_class, wrapped_methods in list(MetaLogger._wrapped_methods.items()):
+            for attr_name, variants in wrapped_methods.items():
+                type.__setattr__(logged_class, attr_name, cls._active_variant(*variants))
+
+
+# Souhrn vzorkovaných volání i při ukončení programu
+atexit.register(MetaLogger.log_sampling_summary)
 
 
 # =============================================================================
@@ -157,6 +941,7 @@ class MetaLogger(type):
 
 class Auto(metaclass=MetaLogger):
     """Třída reprezentující auto."""
+    @log_always
     def __init__(self, model):
         self.model = model
 
@@ -169,6 +954,7 @@ class Auto(metaclass=MetaLogger):
 
 class Letadlo(metaclass=MetaLogger):
     """Třída reprezentující letadlo."""
+    @log_always
     def __init__(self, name):
         self.name = name
         print(f"✈️ Letadlo {self.name} bylo vytvořeno.")
@@ -185,23 +971,22 @@ class Letadlo(metaclass=MetaLogger):
 
 if __name__ == "__main__":
     # Přesměrování výstupu do terminálu i logu (nutné pro výpis terminálových zpráv do logu)
-    sys.stdout = DualLogger(sys.stdout)
-
-    # Zaznamenání startu skriptu - vždy
-    logging.info(f"=============== 🚀 Skript {os.path.basename(__file__)} spuštěn. ===============")
+    with DualLogger(sys.stdout) as dual_logger, contextlib.redirect_stdout(dual_logger):
+        # Zaznamenání startu skriptu - vždy
+        logging.info(f"=============== 🚀 Skript {os.path.basename(__file__)} spuštěn. ===============")
 
-    # Test metatříd s logováním
-    auto = Auto("Tesla")
-    auto.start()
-    auto.stop()
+        # Test metatříd s logováním
+        auto = Auto("Tesla")
+        auto.start()
+        auto.stop()
 
-    letadlo = Letadlo("Boeing 747")
-    letadlo.vzlet()
-    letadlo.pristani()
+        letadlo = Letadlo("Boeing 747")
+        letadlo.vzlet()
+        letadlo.pristani()
 
-    MetaLogger.disable_logging()  # Vypneme logování
+        MetaLogger.disable_logging()  # Vypneme logování
 
-    auto.start()  # Toto volání už se nezaloguje
+        auto.start()  # Toto volání už se nezaloguje
 
-    # Zaznamenání ukončení skriptu - vždy
-    logging.info(f"=============== 🏁 Skript {os.path.basename(__file__)} ukončen. ===============\n\n")
+        # Zaznamenání ukončení skriptu - vždy
+        logging.info(f"=============== 🏁 Skript {os.path.basename(__file__)} ukončen. ===============\n\n")
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+# Příliš žluťoučký kůň úpěl ďábelské ódy - testovací pangram
+
+# Pravidla, které metody mají metatřídy v OOP_metaClass1.py a OOP_metaClass2.py obalit logováním
+"""_summary_
+# Výběr metod pro logování
+
+Metatřída `MetaLogger` neobaluje všechny atributy třídy, ale jen metody vybrané pravidly.
+Pravidla se vyhodnotí jednou při vytvoření třídy, nevybrané metody zůstanou beze změny
+a jejich volání tak nemá žádnou režii.
+
+Pořadí vyhodnocení:
+    1. dekorátory `@log_always` a `@no_log` u metody,
+    2. atributy třídy `__log_include__` a `__log_exclude__` (n-tice vzorů pro `fnmatch`,
+       dědí se z předků), jinak výchozí vzory modulu s metatřídou,
+    3. metoda se obalí, pokud její název odpovídá některému vzoru include a žádnému vzoru exclude.
+
+Obalují se běžné funkce a také `staticmethod`, `classmethod` a `property` (getter, setter
+i deleter zvlášť). Jiné volatelné atributy, např. vnořené třídy, se neobalují. Funkce, které
+už metatřída obalila (`mark_wrapper`), se znovu neobalují, např. při `metoda = Predek.metoda`.
+
+## Příklad
+    class Auto(metaclass=MetaLogger):
+        __log_exclude__ = ("_*", "rychlost")
+
+        @log_always
+        def __init__(self, model): ...
+
+        @no_log
+        def pomocna_metoda(self): ...
+"""
+
+from fnmatch import fnmatchcase
+
+# Atribut funkce, do kterého dekorátory zapisují rozhodnutí (True = logovat vždy, False = nikdy)
+_LOG_MARKER = "__log_call__"
+# Atribut, kterým metatřída označí své obalující funkce
+_WRAPPER_MARKER = "__log_wrapper__"
+
+
+def _accessors(value):
+    """Vrátí funkce atributu třídy, které lze obalit: [(přípona názvu, funkce)]."""
+    if isinstance(value, (staticmethod, classmethod)):
+        return [("", value.__func__)]
+    if isinstance(value, property):
+        return [(suffix, function) for suffix, function in
+                (("", value.fget), (".setter", value.fset), (".deleter", value.fdel)) if function is not None]
+    if callable(value) and hasattr(value, "__code__"):
+        return [("", value)]
+    return []
+
+
+def _mark(value, decision):
+    for _, function in _accessors(value):
+        setattr(function, _LOG_MARKER, decision)
+    return value
+
+
+def mark_wrapper(wrapper):
+    """Označí funkci jako obalující, pravidla ji pak už znovu neobalí."""
+    setattr(wrapper, _WRAPPER_MARKER, True)
+    return wrapper
+
+
+def log_always(value):
+    """Dekorátor: metoda se obalí logováním bez ohledu na vzory."""
+    return _mark(value, True)
+
+
+def no_log(value):
+    """Dekorátor: metoda se nikdy neobalí logováním."""
+    return _mark(value, False)
+
+
+def class_patterns(dct, bases, attribute, default):
+    """Vrátí vzory z atributu nové třídy, jinak z nejbližšího předka, jinak výchozí."""
+    if attribute in dct:
+        return tuple(dct[attribute])
+    for base in bases:
+        patterns = getattr(base, attribute, None)
+        if patterns is not None:
+            return tuple(patterns)
+    return tuple(default)
+
+
+def should_instrument(name, value, include, exclude):
+    """Rozhodne, zda se má atribut třídy obalit logováním."""
+    accessors = _accessors(value)
+    if not accessors:
+        return False
+    if any(getattr(function, _WRAPPER_MARKER, False) for _, function in accessors):
+        return False
+    for _, function in accessors:
+        decision = getattr(function, _LOG_MARKER, None)
+        if decision is not None:
+            return decision
+    return (any(fnmatchcase(name, pattern) for pattern in include)
+            and not any(fnmatchcase(name, pattern) for pattern in exclude))
+
+
+def instrument_attribute(name, value, wrap):
+    """Obalí funkce atributu třídy a vrátí n-tici obalených atributů stejného druhu.
+
+    wrap(funkce, název) vrací n-tici obalených variant funkce (např. s logováním a s měřením),
+    výsledek má jeden atribut (funkci, staticmethod, classmethod, property) na každou variantu.
+    """
+    if isinstance(value, (staticmethod, classmethod)):
+        return tuple(type(value)(wrapper) for wrapper in wrap(value.__func__, name))
+    if isinstance(value, property):
+        variants = {suffix: wrap(function, name + suffix) for suffix, function in _accessors(value)}
+        return tuple(
+            property(variants[""][index] if "" in variants else None,
+                     variants[".setter"][index] if ".setter" in variants else None,
+                     variants[".deleter"][index] if ".deleter" in variants else None,
+                     value.__doc__)
+            for index in range(len(next(iter(variants.values()))))
+        )
+    return wrap(value, name)
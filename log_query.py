@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+# Příliš žluťoučký kůň úpěl ďábelské ódy - testovací pangram
+
+# Rychlé dotazy nad strukturovaným logem volání metod (JSON Lines z OOP_metaClass2.py)
+"""_summary_
+# Dotazy nad strukturovaným logem volání metod
+
+`MetaLogger.enable_structured_log()` v `OOP_metaClass2.py` zapisuje každé volání metody jako
+jeden řádek JSON, který vždy začíná klíčem `"ts"` (čas v ns) a soubor je podle něj seřazený
+(čas se čte až pod zámkem souboru). Tento skript takové soubory
+prohledává bez parsování všech řádků:
+    - soubor se otevře přes `mmap` a začátek časového rozsahu se najde půlením intervalu,
+    - na řádky s hledaným textem (`"class":"Auto",`) se skáče přímo hledáním v bajtech
+      a JSON se parsuje jen u řádků, které filtrem prošly,
+    - čtení skončí, jakmile čas záznamů překročí konec rozsahu.
+Komprimované segmenty po rotaci (modul `log_rotation`) se čtou postupně bez `mmap`.
+
+## Použití
+    python log_query.py [soubory...] [--class Auto] [--method start]
+                        [--since "2025-02-16 18:00:00"] [--until "2025-02-16 19:00:00"]
+                        [--group-by class|method|class.method|thread] [--limit 100]
+Bez zadaných souborů se prohledá `log/method_calls_2.jsonl` včetně rotovaných segmentů.
+Bez `--group-by` vypíše odpovídající záznamy, s ním souhrnnou tabulku (počet, doba trvání).
+"""
+
+import argparse
+import json
+import mmap
+import os
+from datetime import datetime
+
+from log_rotation import COMPRESSIONS, list_segments
+
+DEFAULT_EVENTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "log", "method_calls_2.jsonl")
+
+
+def _record_ts(line):
+    """Vrátí čas záznamu bez parsování celého JSON (řádek začíná b'{"ts":')."""
+    return int(line[6:line.index(b",", 6)])
+
+
+def _find_first(mapped_file, size, since_ns):
+    """Najde půlením offset prvního řádku s časem >= since_ns."""
+    low, high = 0, size
+    while low < high:
+        middle = (low + high) // 2
+        start = mapped_file.rfind(b"\n", 0, middle) + 1
+        end = mapped_file.find(b"\n", start, size)
+        if _record_ts(mapped_file[start:end]) < since_ns:
+            low = end + 1
+        else:
+            high = start
+    return low
+
+
+def _iter_mapped_lines(path, since_ns, until_ns, needles):
+    with open(path, "rb") as events_file:
+        if os.fstat(events_file.fileno()).st_size == 0:
+            return
+        with mmap.mmap(events_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped_file:
+            # Rozepsaný poslední řádek bez konce řádku vynecháme
+            size = mapped_file.rfind(b"\n") + 1
+            position = 0
+            if since_ns is not None:
+                position = _find_first(mapped_file, size, since_ns)
+            while position < size:
+                if needles:
+                    # Na další řádek s hledaným textem skočíme přímo (hledání v C, ne po řádcích)
+                    found = mapped_file.find(needles[0], position, size)
+                    if found == -1:
+                        break
+                    position = mapped_file.rfind(b"\n", position, found) + 1 or position
+                end = mapped_file.find(b"\n", position, size)
+                line = mapped_file[position:end]
+                position = end + 1
+                if until_ns is not None and _record_ts(line) > until_ns:
+                    break
+                if all(needle in line for needle in needles):
+                    yield line
+
+
+def _iter_compressed_lines(path, open_compressed, needles):
+    with open_compressed(path, "rb") as events_file:
+        for line in events_file:
+            if all(needle in line for needle in needles):
+                yield line
+
+
+def default_paths(events_file=DEFAULT_EVENTS_FILE):
+    """Vrátí rotované segmenty a aktuální soubor strukturovaného logu v časovém pořadí."""
+    paths = list_segments(events_file)
+    if os.path.exists(events_file):
+        paths.append(events_file)
+    return paths
+
+
+def query(paths, class_name=None, method_name=None, since_ns=None, until_ns=None):
+    """Prochází záznamy (slovníky) ze souborů, které odpovídají všem zadaným podmínkám."""
+    needles = []
+    if class_name is not None:
+        needles.append(b'"class":' + json.dumps(class_name).encode("ascii") + b",")
+    if method_name is not None:
+        needles.append(b'"method":' + json.dumps(method_name).encode("ascii") + b",")
+    for path in paths:
+        lines = None
+        for extension, open_compressed in COMPRESSIONS.values():
+            if path.endswith(extension):
+                lines = _iter_compressed_lines(path, open_compressed, needles)
+        if lines is None:
+            lines = _iter_mapped_lines(path, since_ns, until_ns, needles)
+        for line in lines:
+            event = json.loads(line)
+            if since_ns is not None and event["ts"] < since_ns:
+                continue
+            if until_ns is not None and event["ts"] > until_ns:
+                continue
+            yield event
+
+
+def aggregate(events, group_by):
+    """Sečte záznamy podle skupiny: {skupina: [počet, součet doby ns, max doba ns, výjimky]}."""
+    groups = {}
+    for event in events:
+        if group_by == "class.method":
+            key = f"{event['class']}.{event['method']}"
+        else:
+            key = str(event[group_by])
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = [0, 0, 0, 0]
+        duration = event["duration_ns"] or 0
+        group[0] += 1
+        group[1] += duration
+        group[2] = max(group[2], duration)
+        group[3] += event["exception"] is not None
+    return groups
+
+
+def _parse_time(value):
+    return int(datetime.fromisoformat(value).timestamp() * 1_000_000_000)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Dotazy nad strukturovaným logem volání metod (JSON Lines).")
+    parser.add_argument("files", nargs="*", help="soubory logu (výchozí: log/method_calls_2.jsonl a jeho segmenty)")
+    parser.add_argument("--class", dest="class_name", help="jen volání metod této třídy")
+    parser.add_argument("--method", dest="method_name", help="jen volání této metody")
+    parser.add_argument("--since", type=_parse_time, help="od času, např. \"2025-02-16 18:00:00\"")
+    parser.add_argument("--until", type=_parse_time, help="do času, např. \"2025-02-16 19:00:00\"")
+    parser.add_argument("--group-by", choices=["class", "method", "class.method", "thread"], help="souhrn podle skupiny")
+    parser.add_argument("--limit", type=int, help="nejvýše tolik vypsaných záznamů")
+    arguments = parser.parse_args(argv)
+
+    paths = arguments.files or default_paths()
+    events = query(paths, arguments.class_name, arguments.method_name, arguments.since, arguments.until)
+    if arguments.group_by is None:
+        for index, event in enumerate(events):
+            if arguments.limit is not None and index >= arguments.limit:
+                break
+            print(json.dumps(event, ensure_ascii=False))
+        return
+    groups = aggregate(events, arguments.group_by)
+    print(f"{'Skupina':<30} {'Volání':>10} {'Celkem ms':>12} {'Průměr µs':>10} {'Max µs':>10} {'Výjimky':>8}")
+    for key, (count, total, longest, exceptions) in sorted(groups.items(), key=lambda item: item[1][0], reverse=True):
+        print(f"{key:<30} {count:>10} {total / 1e6:>12.3f} {total / count / 1e3:>10.1f} {longest / 1e3:>10.1f} {exceptions:>8}")
+
+
+if __name__ == "__main__":
+    main()
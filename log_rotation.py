@@ -0,0 +1,340 @@
+# -*- coding: utf-8 -*-
+# Příliš žluťoučký kůň úpěl ďábelské ódy - testovací pangram
+
+# Rotace a komprese logovacích souborů, sdílí ji OOP_metaClass1.py i OOP_metaClass2.py
+"""_summary_
+# Rotace logů s kompresí
+
+Logovací soubor (např. `log/method_calls_1.log`) by při dlouhém běhu rostl bez omezení.
+Třída `RotatingLogFile` ho proto po překročení velikosti nebo stáří uzavře, přejmenuje na
+segment s časovým razítkem (`method_calls_1.log.20250216-184433`) a pokračuje do nového souboru.
+Uzavřené segmenty komprimuje na pozadí samostatné vlákno (gzip, bz2 nebo lzma ze standardní
+knihovny) a nejstarší segmenty se mažou podle nastavené retence. Při ukončení programu se
+na dokončení komprese počká; segmenty, jejichž kompresi přerušil konec procesu, se při dalším
+otevření logu zkomprimují znovu a zbylé dočasné soubory se smažou.
+
+Funkce `iter_log_lines` čte všechny segmenty včetně komprimovaných i aktuální soubor
+jako jeden proud řádků seřazený podle času.
+
+`RotatingLogHandler` je handler pro modul `logging`, který zapisuje přes `RotatingLogFile`.
+"""
+
+import atexit
+import bz2
+import glob
+import gzip
+import logging
+import lzma
+import os
+import queue
+import re
+import shutil
+import threading
+import time
+
+# Podporované komprese: {název: (přípona, funkce pro otevření)}
+COMPRESSIONS = {
+    "gzip": (".gz", gzip.open),
+    "bz2": (".bz2", bz2.open),
+    "lzma": (".xz", lzma.open),
+}
+
+# Segment vzniklý rotací: <log>.<YYYYmmdd-HHMMSS>[-<n>][.<přípona komprese>]
+_SEGMENT_PATTERN = re.compile(r"\.(\d{8}-\d{6})(?:-(\d+))?(\.gz|\.bz2|\.xz)?$")
+# Dočasný soubor rozpracované komprese segmentu: <segment><přípona komprese>.<pid>.tmp
+_TEMPORARY_PATTERN = re.compile(r"(\.\d{8}-\d{6}(?:-\d+)?)(?:\.gz|\.bz2|\.xz)(?:\.(\d+))?\.tmp$")
+# Mimo POSIX nelze ověřit, zda proces běží; dočasné soubory starší než tolik sekund se smažou
+STALE_TEMPORARY_AGE = 3600
+
+
+class _Compressor:
+    """Vlákno, které na pozadí komprimuje uzavřené segmenty logu."""
+
+    def __init__(self):
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, path, compression, on_done=None):
+        """Zařadí segment ke kompresi, on_done() se zavolá po jejím dokončení."""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="LogCompressor", daemon=True)
+                self._thread.start()
+        self._queue.put((path, compression, on_done))
+
+    def wait(self):
+        """Počká, až budou zkomprimovány všechny zařazené segmenty."""
+        if self._thread is not None and self._thread.is_alive():
+            done = threading.Event()
+            self._queue.put((None, None, done.set))
+            done.wait()
+
+    def _run(self):
+        while True:
+            path, compression, on_done = self._queue.get()
+            try:
+                if path is not None:
+                    compress_segment(path, compression)
+            except OSError:
+                # Segment mezitím smazala retence nebo zkomprimoval jiný proces; jinak
+                # zůstane nezkomprimovaný a zkusí se znovu při dalším otevření logu
+                pass
+            finally:
+                if on_done is not None:
+                    on_done()
+
+
+_compressor = _Compressor()
+# Démonické vlákno by konec programu přerušil uprostřed komprese
+atexit.register(_compressor.wait)
+
+
+def compress_segment(path, compression="gzip"):
+    """Zkomprimuje segment logu a původní soubor smaže. Vrátí cestu ke komprimovanému souboru."""
+    extension, open_compressed = COMPRESSIONS[compression]
+    # Číslo procesu v názvu: souběžné komprese v různých procesech se nepřepisují
+    # a po ukončeném procesu lze dočasný soubor poznat
+    temporary_path = f"{path}{extension}.{os.getpid()}.tmp"
+    try:
+        with open(path, "rb") as source, open_compressed(temporary_path, "wb") as target:
+            shutil.copyfileobj(source, target, 1024 * 1024)
+        os.replace(temporary_path, path + extension)
+    except BaseException:
+        try:
+            os.remove(temporary_path)
+        except FileNotFoundError:
+            pass
+        raise
+    os.remove(path)
+    return path + extension
+
+
+def _is_stale_temporary(path, pid):
+    """Zjistí, zda dočasný soubor komprese zůstal po procesu, který už neběží."""
+    if pid is None:
+        return True  # Starší formát názvu bez čísla procesu
+    if pid == os.getpid():
+        return False
+    if os.name == "posix":
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return True
+        except PermissionError:
+            return False
+        return False
+    return time.time() - os.path.getmtime(path) >= STALE_TEMPORARY_AGE
+
+
+def list_segments(log_file):
+    """Vrátí cesty k rotovaným segmentům logu seřazené od nejstaršího."""
+    segments = []
+    for path in glob.glob(glob.escape(log_file) + ".*"):
+        match = _SEGMENT_PATTERN.fullmatch(path[len(log_file):])
+        if match:
+            segments.append(((match.group(1), int(match.group(2) or 0)), path))
+    segments.sort()
+    return [path for _, path in segments]
+
+
+def _open_segment(path):
+    for extension, open_compressed in COMPRESSIONS.values():
+        if path.endswith(extension):
+            return open_compressed(path, "rt", encoding="utf-8")
+    try:
+        return open(path, "r", encoding="utf-8")
+    except FileNotFoundError:
+        # Segment byl mezitím zkomprimován
+        for extension, open_compressed in COMPRESSIONS.values():
+            if os.path.exists(path + extension):
+                return open_compressed(path + extension, "rt", encoding="utf-8")
+        raise
+
+
+def iter_log_lines(log_file):
+    """Prochází řádky všech segmentů logu (i komprimovaných) a aktuálního souboru v časovém pořadí."""
+    paths = list_segments(log_file)
+    if os.path.exists(log_file):
+        paths.append(log_file)
+    for path in paths:
+        try:
+            segment = _open_segment(path)
+        except FileNotFoundError:
+            continue  # Segment mezitím smazala retence
+        with segment:
+            yield from segment
+
+
+class RotatingLogFile:
+    """Textový logovací soubor s rotací podle velikosti a času.
+
+    Atributy:
+        path (str): Cesta k aktuálnímu logovacímu souboru.
+        max_bytes (int | None): Rotace po překročení velikosti souboru.
+        rotate_interval (float | None): Rotace po uplynutí tolika sekund od začátku segmentu.
+        backup_count (int | None): Kolik rotovaných segmentů se ponechá (retence).
+        max_age (float | None): Segmenty starší než tolik sekund se smažou.
+        compression (str | None): "gzip", "bz2", "lzma", nebo None bez komprese.
+    Zápis je chráněný zámkem, do jednoho souboru tedy může psát více vláken.
+    """
+
+    def __init__(self, path, max_bytes=10 * 1024 * 1024, rotate_interval=24 * 3600,
+                 backup_count=30, max_age=None, compression="gzip"):
+        if compression is not None and compression not in COMPRESSIONS:
+            raise ValueError(f"Neznámá komprese: {compression}")
+        self.path = path
+        self.max_bytes = max_bytes
+        self.rotate_interval = rotate_interval
+        self.backup_count = backup_count
+        self.max_age = max_age
+        self.compression = compression
+        self._lock = threading.RLock()
+        self._last_stamp = 0  # Poslední čas předaný write_stamped()
+        self._stream = None
+        self._open()
+        self.recover_segments()
+
+    def _open(self):
+        self._stream = open(self.path, "a", encoding="utf-8")
+        stat_result = os.fstat(self._stream.fileno())
+        self._size = stat_result.st_size
+        # Začátek segmentu odhadujeme podle posledního zápisu do existujícího souboru
+        self._segment_start = stat_result.st_mtime if stat_result.st_size else time.time()
+
+    @property
+    def closed(self):
+        return self._stream is None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write(self, text):
+        with self._lock:
+            if self._stream is None:
+                raise ValueError("I/O operation on closed file.")
+            if self._should_rotate():
+                self.rotate()
+            self._stream.write(text)
+            self._size += len(text.encode("utf-8")) if not text.isascii() else len(text)
+            return len(text)
+
+    def write_stamped(self, format_line):
+        """Zapíše řádek `format_line(time.time_ns())`.
+
+        Čas se čte až pod zámkem souboru, řádky zapsané touto metodou jsou tedy
+        i při zápisu z více vláken seřazené podle času (ani posun systémových hodin
+        zpět pořadí neporuší, čas se pak drží na posledním zapsaném). `format_line` má být rychlá.
+        """
+        with self._lock:
+            self._last_stamp = max(time.time_ns(), self._last_stamp)
+            return self.write(format_line(self._last_stamp))
+
+    def _should_rotate(self):
+        if self._size == 0:
+            return False
+        if self.max_bytes is not None and self._size >= self.max_bytes:
+            return True
+        return self.rotate_interval is not None and time.time() - self._segment_start >= self.rotate_interval
+
+    def flush(self):
+        with self._lock:
+            if self._stream is not None:
+                self._stream.flush()
+
+    def close(self):
+        with self._lock:
+            if self._stream is not None:
+                self._stream.close()
+                self._stream = None
+
+    def reopen(self):
+        """Znovu otevře soubor, např. poté, co ho mezitím rotoval jiný proces."""
+        with self._lock:
+            self.close()
+            self._open()
+
+    def rotate(self):
+        """Uzavře aktuální soubor jako segment, začne nový a segment předá ke kompresi."""
+        with self._lock:
+            self._stream.close()
+            stamp = time.strftime("%Y%m%d-%H%M%S")
+            segment_path = f"{self.path}.{stamp}"
+            counter = 0
+            while glob.glob(glob.escape(segment_path) + "*"):
+                counter += 1
+                segment_path = f"{self.path}.{stamp}-{counter}"
+            os.replace(self.path, segment_path)
+            self._open()
+        if self.compression is not None:
+            _compressor.submit(segment_path, self.compression, self.apply_retention)
+        else:
+            self.apply_retention()
+
+    def recover_segments(self):
+        """Uklidí po procesu ukončeném během komprese.
+
+        Smaže dočasné soubory komprese po procesech, které už neběží, a znovu zařadí
+        ke kompresi nezkomprimované segmenty, které právě nekomprimuje jiný proces.
+        """
+        in_progress = set()
+        for path in glob.glob(glob.escape(self.path) + ".*.tmp"):
+            match = _TEMPORARY_PATTERN.fullmatch(path[len(self.path):])
+            if not match:
+                continue
+            try:
+                if _is_stale_temporary(path, int(match.group(2)) if match.group(2) else None):
+                    os.remove(path)
+                else:
+                    in_progress.add(self.path + match.group(1))
+            except FileNotFoundError:
+                pass  # Komprese mezitím skončila
+        if self.compression is None:
+            return
+        for path in list_segments(self.path):
+            if _SEGMENT_PATTERN.fullmatch(path[len(self.path):]).group(3) is None and path not in in_progress:
+                _compressor.submit(path, self.compression, self.apply_retention)
+
+    def apply_retention(self):
+        """Smaže segmenty nad rámec backup_count a segmenty starší než max_age."""
+        segments = list_segments(self.path)
+        if self.backup_count is not None and len(segments) > self.backup_count:
+            expired = segments[:len(segments) - self.backup_count]
+            segments = segments[len(expired):]
+        else:
+            expired = []
+        if self.max_age is not None:
+            oldest_allowed = time.time() - self.max_age
+            expired += [path for path in segments if os.path.getmtime(path) < oldest_allowed]
+        for path in expired:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def wait_for_compression():
+        """Počká na dokončení komprese všech rotovaných segmentů."""
+        _compressor.wait()
+
+
+class RotatingLogHandler(logging.Handler):
+    """Handler modulu logging, který zapisuje záznamy přes RotatingLogFile."""
+
+    def __init__(self, log_file):
+        super().__init__()
+        self.log_file = log_file
+
+    def emit(self, record):
+        try:
+            self.log_file.write(self.format(record) + "\n")
+            self.log_file.flush()
+        except Exception:
+            self.handleError(record)
+
+    def close(self):
+        self.log_file.close()
+        super().close()